@@ -0,0 +1,157 @@
+"""
+Registro de actividad de usuarios (tabla user_activities) sin INSERT en la
+petición.
+
+log_activity() construye la fila y la deja en un buffer del proceso. Un hilo
+daemon la escribe con bulk_create cuando el buffer llega a FLUSH_SIZE filas o
+cada FLUSH_INTERVAL_S segundos. Al cerrar el worker (atexit) se vacía el buffer.
+La latencia del login no depende así del volumen de auditoría. A cambio, una
+actividad puede tardar hasta FLUSH_INTERVAL_S en aparecer en los listados.
+
+    ACTIVITY_LOG = {
+        'BUFFERED':         True,  # False → INSERT síncrono (tests, scripts)
+        'FLUSH_SIZE':       100,
+        'FLUSH_INTERVAL_S': 2,
+        'MAX_BUFFER':       10000, # tope si la BD no responde (se descartan las nuevas)
+        'RETENTION_MONTHS': 12,    # manage.py prune_activities
+    }
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import UserActivity
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BUFFERED':         True,
+    'FLUSH_SIZE':       100,
+    'FLUSH_INTERVAL_S': 2,
+    'MAX_BUFFER':       10000,
+    'RETENTION_MONTHS': 12,
+}
+
+
+def _config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ACTIVITY_LOG', {})}
+
+
+class ActivityBuffer:
+    """Buffer thread-safe de UserActivity sin guardar + hilo de volcado."""
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._flush   = threading.Lock()   # un único volcado a la vez
+        self._event   = threading.Event()
+        self._pending: list = []
+        self._thread  = None
+        self.dropped  = 0
+
+    def add(self, activity: UserActivity) -> None:
+        cfg = _config()
+        with self._lock:
+            if len(self._pending) >= cfg['MAX_BUFFER']:
+                self.dropped += 1
+                return
+            self._pending.append(activity)
+            full = len(self._pending) >= cfg['FLUSH_SIZE']
+        self._ensure_started()
+        if full:
+            self._event.set()
+
+    def flush(self) -> int:
+        """Escribe todo lo pendiente con bulk_create. Devuelve filas escritas."""
+        with self._flush:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                UserActivity.objects.bulk_create(batch, batch_size=500)
+                return len(batch)
+            except DatabaseError as e:
+                # Una fila inválida (usuario borrado, valor fuera de rango)
+                # invalida el lote entero: se reintenta fila a fila.
+                logger.warning(f"bulk_create de actividades falló ({e}); reintentando fila a fila")
+                return self._insert_each(batch)
+
+    def _insert_each(self, batch) -> int:
+        written = 0
+        for activity in batch:
+            try:
+                with transaction.atomic():
+                    activity.save(force_insert=True)
+                written += 1
+            except DatabaseError as e:
+                logger.error(f"Actividad descartada ({activity.activity_type}, user={activity.user_id}): {e}")
+        return written
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='activity-log', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._event.wait(_config()['FLUSH_INTERVAL_S'])
+            self._event.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error volcando el buffer de actividades")
+            finally:
+                close_old_connections()
+
+
+BUFFER = ActivityBuffer()
+atexit.register(BUFFER.flush)
+
+
+def log_activity(user, activity_type, description, ip_address=None, user_agent=None) -> UserActivity:
+    """Registra una actividad; con BUFFERED la escritura es diferida."""
+    # user_id y no user: la fila no debe retener la instancia hasta el volcado
+    activity = UserActivity(
+        user_id=user.pk,
+        activity_type=activity_type,
+        description=description,
+        ip_address=ip_address,
+        user_agent=user_agent,
+    )
+    if _config()['BUFFERED']:
+        BUFFER.add(activity)
+    else:
+        activity.save()
+    return activity
+
+
+def prune_activities(months: int = None, chunk: int = 5000, now=None) -> int:
+    """
+    Borra las actividades anteriores al inicio del mes de hace `months` meses
+    (retención por meses completos), en lotes para no bloquear la tabla.
+    """
+    months = _config()['RETENTION_MONTHS'] if months is None else months
+    now    = now or timezone.now()
+    year, month = divmod(now.year * 12 + now.month - 1 - months, 12)
+    cutoff = now.replace(year=year, month=month + 1, day=1, hour=0, minute=0,
+                         second=0, microsecond=0)
+
+    deleted = 0
+    while True:
+        ids = list(
+            UserActivity.objects.filter(created_at__lt=cutoff)
+            .order_by('created_at').values_list('pk', flat=True)[:chunk]
+        )
+        if not ids:
+            break
+        deleted += UserActivity.objects.filter(pk__in=ids).delete()[0]
+    return deleted
@@ -0,0 +1,19 @@
+"""
+Management command para aplicar la retención de user_activities
+Ejecutar: python manage.py prune_activities [--months N]
+"""
+from django.core.management.base import BaseCommand
+
+from authentication.activity_log import prune_activities
+
+
+class Command(BaseCommand):
+    help = 'Borrar actividades de usuario anteriores a la ventana de retención (meses completos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help='Meses a conservar (por defecto ACTIVITY_LOG["RETENTION_MONTHS"])')
+
+    def handle(self, *args, **options):
+        deleted = prune_activities(options['months'])
+        self.stdout.write(self.style.SUCCESS(f'Actividades borradas: {deleted}'))
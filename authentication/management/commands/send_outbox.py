@@ -0,0 +1,36 @@
+"""
+Management command para entregar la bandeja de correo (email_outbox) y
+aplicar su retención (RETENTION_DAYS)
+Ejecutar: python manage.py send_outbox [--loop]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.outbox import _config, deliver_pending, prune_outbox
+
+
+class Command(BaseCommand):
+    help = 'Enviar los correos pendientes de la bandeja de salida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir entregando cada POLL_S segundos (worker dedicado)')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = {'sent': 0, 'retry': 0, 'failed': 0}
+            while True:
+                stats = deliver_pending()
+                for key, value in stats.items():
+                    totals[key] += value
+                if not sum(stats.values()):
+                    break
+            pruned = prune_outbox()
+            self.stdout.write(self.style.SUCCESS(
+                f"Enviados: {totals['sent']}, reintentos: {totals['retry']}, "
+                f"fallidos: {totals['failed']}, filas antiguas borradas: {pruned}"
+            ))
+            if not options['loop']:
+                return
+            time.sleep(_config()['POLL_S'])
@@ -308,7 +308,8 @@ class UserActivity(models.Model):
     description = models.TextField(blank=True, null=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     user_agent = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Fecha del evento (no del INSERT): authentication.activity_log escribe en diferido
+    created_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.get_activity_type_display()}"
@@ -321,6 +322,7 @@ class UserActivity(models.Model):
         indexes = [
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['activity_type']),
+            models.Index(fields=['created_at']),
         ]
 
 
@@ -449,4 +451,66 @@ class AdminRequest(models.Model):
     
     @property
     def is_rejected(self):
-        return self.status == 'rejected'
\ No newline at end of file
+        return self.status == 'rejected'
+
+class SystemSetting(models.Model):
+    """
+    Configuración global del sistema (p. ej. modo mantenimiento), una fila por
+    clave. Se lee a través de authentication.system_settings (caché TTL por
+    proceso con invalidación por versión).
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+    updated_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+
+    class Meta:
+        db_table = 'system_settings'
+        verbose_name = 'Configuración del Sistema'
+        verbose_name_plural = 'Configuraciones del Sistema'
+
+    def __str__(self):
+        return f"{self.key} = {self.value!r}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Bandeja de salida de correos. Las vistas encolan aquí y
+    authentication.outbox los entrega en segundo plano, por lotes y con
+    reintentos.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviado'),
+        ('failed', 'Fallido'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Próximo intento; mientras se envía actúa como lease (reclamado hasta...)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'email_outbox'
+        verbose_name = 'Correo Saliente'
+        verbose_name_plural = 'Correos Salientes'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
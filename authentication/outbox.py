@@ -0,0 +1,232 @@
+"""
+Envío de correo asíncrono a través de la tabla email_outbox.
+
+enqueue_email() inserta el mensaje y, si el proceso tiene hilo emisor, lo
+despierta al confirmar la transacción; la petición HTTP nunca espera al
+servidor SMTP.
+
+deliver_pending() reclama un lote de mensajes vencidos (lease de LEASE_S
+segundos, así que un worker caído no pierde correos) y los envía por una
+única conexión SMTP (get_connection + send_messages). Los fallos se
+reintentan con backoff exponencial hasta MAX_ATTEMPTS.
+
+El cuerpo puede llevar enlaces con tokens vivos (verificación, recuperación
+de contraseña): se borra en cuanto el mensaje queda enviado o fallido, y
+prune_outbox() elimina esas filas pasados RETENTION_DAYS días.
+
+El hilo emisor solo arranca desde los puntos de entrada web
+(tree_of_science/wsgi.py y asgi.py, que también usa runserver) mediante
+start_background_sender(); migrate, shell, tests o celery nunca lo lanzan.
+Al arrancar hace una pasada inmediata, así que los reintentos pendientes se
+retoman tras reiniciar un worker aunque nadie encole correos nuevos.
+
+    EMAIL_OUTBOX = {
+        'BACKGROUND':     True,  # hilo emisor en cada proceso web
+        'BATCH_SIZE':     50,    # mensajes por conexión SMTP
+        'MAX_ATTEMPTS':   5,
+        'BACKOFF_S':      60,    # 60 s, 120 s, 240 s, ... (máx. 1 h)
+        'LEASE_S':        300,
+        'POLL_S':         30,    # reintentos pendientes sin nuevos encolados
+        'RETENTION_DAYS': 30,    # filas enviadas / fallidas
+    }
+
+Sin hilo (BACKGROUND=False) se entrega con `python manage.py send_outbox`.
+Para tests: EMAIL_BACKEND=django.core.mail.backends.locmem.EmailBackend.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKGROUND':     True,
+    'BATCH_SIZE':     50,
+    'MAX_ATTEMPTS':   5,
+    'BACKOFF_S':      60,
+    'LEASE_S':        300,
+    'POLL_S':         30,
+    'RETENTION_DAYS': 30,
+}
+
+_MAX_BACKOFF_S = 3600
+
+# Frecuencia de prune_outbox() dentro del hilo emisor
+_PRUNE_EVERY_S = 3600
+
+
+def _config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'EMAIL_OUTBOX', {})}
+
+
+def enqueue_email(subject, message, recipients, from_email=None) -> OutboundEmail:
+    """Encola un correo de texto plano; se envía tras el commit de la transacción."""
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+    transaction.on_commit(SENDER.wake)
+    return email
+
+
+def _claim(batch_size: int, lease_s: int) -> list:
+    """Reclama hasta batch_size mensajes vencidos moviendo su next_attempt_at."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[e.pk for e in batch]).update(
+                next_attempt_at=now + timedelta(seconds=lease_s)
+            )
+    return batch
+
+
+def deliver_pending(batch_size: int = None) -> dict:
+    """Envía un lote de la bandeja por una sola conexión. Devuelve contadores."""
+    cfg   = _config()
+    batch = _claim(batch_size or cfg['BATCH_SIZE'], cfg['LEASE_S'])
+    stats = {'sent': 0, 'retry': 0, 'failed': 0}
+    if not batch:
+        return stats
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Servidor inaccesible: todo el lote vuelve a la cola con backoff
+        logger.warning(f"No se pudo abrir la conexión SMTP: {e}")
+        for email in batch:
+            _record_failure(email, e, cfg, stats)
+        return stats
+
+    try:
+        for email in batch:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.recipients,
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(email, e, cfg, stats)
+                continue
+            email.status          = 'sent'
+            email.attempts       += 1
+            email.sent_at         = timezone.now()
+            email.last_error      = ''
+            email.body            = ''   # no conservar tokens una vez entregado
+            email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error', 'body'])
+            stats['sent'] += 1
+    finally:
+        connection.close()
+
+    logger.info(f"Bandeja de correo: {stats}")
+    return stats
+
+
+def _record_failure(email, exc, cfg, stats) -> None:
+    email.attempts  += 1
+    email.last_error = str(exc)[:1000]
+    if email.attempts >= cfg['MAX_ATTEMPTS']:
+        email.status = 'failed'
+        email.body   = ''
+        stats['failed'] += 1
+        logger.error(f"Correo {email.pk} descartado tras {email.attempts} intentos: {exc}")
+    else:
+        delay = min(cfg['BACKOFF_S'] * 2 ** (email.attempts - 1), _MAX_BACKOFF_S)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        stats['retry'] += 1
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'body'])
+
+
+def prune_outbox(days: int = None) -> int:
+    """
+    Borra las filas enviadas / fallidas de más de `days` días y vacía el cuerpo
+    de las restantes (filas anteriores a que se limpiara al enviar).
+    """
+    days   = _config()['RETENTION_DAYS'] if days is None else days
+    done   = OutboundEmail.objects.filter(status__in=('sent', 'failed'))
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = done.filter(created_at__lt=cutoff).delete()[0]
+    done.exclude(body='').update(body='')
+    return deleted
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# HILO EMISOR
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class OutboxSender:
+    """Hilo daemon por proceso: entrega al ser despertado o cada POLL_S segundos."""
+
+    def __init__(self):
+        self._event  = threading.Event()
+        self._lock   = threading.Lock()
+        self._thread = None
+        self._pruned = None   # último prune_outbox() (monotonic)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Arranca el hilo con una pasada inmediata (pendientes de antes del reinicio)."""
+        self._ensure_started()
+        self._event.set()
+
+    def wake(self) -> None:
+        """Adelanta la siguiente pasada; sin hilo arrancado no hace nada."""
+        if self.running:
+            self._event.set()
+
+    def _ensure_started(self) -> None:
+        if self.running:
+            return
+        with self._lock:
+            if not self.running:
+                self._thread = threading.Thread(
+                    target=self._run, name='email-outbox', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._event.wait(_config()['POLL_S'])
+            self._event.clear()
+            try:
+                # Vaciar la cola vencida lote a lote
+                while sum(deliver_pending().values()):
+                    pass
+                if self._pruned is None or time.monotonic() - self._pruned >= _PRUNE_EVERY_S:
+                    prune_outbox()
+                    self._pruned = time.monotonic()
+            except Exception:
+                logger.exception("Error en el hilo de la bandeja de correo")
+            finally:
+                close_old_connections()
+
+
+SENDER = OutboxSender()
+
+
+def start_background_sender() -> bool:
+    """Arranca SENDER si EMAIL_OUTBOX['BACKGROUND']; se llama desde wsgi.py / asgi.py."""
+    if not _config()['BACKGROUND']:
+        return False
+    SENDER.start()
+    return True
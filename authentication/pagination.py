@@ -0,0 +1,35 @@
+"""
+Paginación por cursor (keyset) para los listados de administración.
+
+CursorPagination de DRF filtra por la posición del último elemento
+(WHERE created_at < cursor) en vez de usar OFFSET, así que el coste de cada
+página no crece con el tamaño de la tabla y las altas concurrentes no
+desplazan las páginas. ?limit=N ajusta el tamaño (máx. 200).
+
+Es opcional: sin ?cursor ni ?limit el listado se devuelve completo, como
+hasta ahora (el panel de administración aún no sigue `next`).
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class AdminListPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def paginate(self, queryset, request, ordering=None):
+        """Lista de la página pedida, o None si la petición no pide paginación."""
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            self.page = None
+            return None
+        if ordering is not None:
+            self.ordering = ordering
+        return self.paginate_queryset(queryset, request)
+
+    def links(self) -> dict:
+        """Enlaces next / previous; vacío si la respuesta no está paginada."""
+        if getattr(self, 'page', None) is None:
+            return {}
+        return {'next': self.get_next_link(), 'previous': self.get_previous_link()}
@@ -0,0 +1,118 @@
+"""
+Configuración global del sistema persistida en la tabla system_settings.
+
+Cada worker guarda una copia en memoria durante TTL_S segundos. Al expirar,
+compara una versión guardada en la caché compartida (una lectura de caché,
+sin tocar la base de datos) y solo relee la tabla si cambió. update() escribe
+las filas y publica una versión nueva, así que un PATCH llega a todos los
+workers en como mucho TTL_S segundos. MAX_AGE_S fuerza una relectura aunque la
+versión no cambie (caché no compartida o versión expulsada).
+
+    SYSTEM_SETTINGS_CACHE = {
+        'TTL_S':     5,    # segundos sin comprobar la versión
+        'MAX_AGE_S': 300,  # segundos máximos sin releer la tabla
+    }
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+
+from .models import SystemSetting
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto (coinciden con AdminSettings.jsx)
+DEFAULTS = {
+    "system_maintenance": False,
+}
+
+VERSION_CACHE_KEY = 'system_settings:version'
+
+_CACHE_DEFAULTS = {
+    'TTL_S':     5,
+    'MAX_AGE_S': 300,
+}
+
+
+def _config() -> dict:
+    return {**_CACHE_DEFAULTS, **getattr(settings, 'SYSTEM_SETTINGS_CACHE', {})}
+
+
+class SystemSettingsCache:
+    """Copia por proceso de system_settings con TTL + versión compartida."""
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._values  = None
+        self._version = None
+        self._checked = 0.0   # última comprobación de versión (monotonic)
+        self._loaded  = 0.0   # última lectura de la tabla (monotonic)
+
+    def get(self) -> dict:
+        cfg = _config()
+        now = time.monotonic()
+        values = self._values
+        if values is not None and now - self._checked < cfg['TTL_S']:
+            return dict(values)
+
+        with self._lock:
+            if self._values is None or now - self._loaded >= cfg['MAX_AGE_S']:
+                self._load(cache.get(VERSION_CACHE_KEY), now)
+            elif now - self._checked >= cfg['TTL_S']:
+                version = cache.get(VERSION_CACHE_KEY)
+                if version is None or version != self._version:
+                    self._load(version, now)
+                else:
+                    self._checked = now
+            return dict(self._values)
+
+    def _load(self, version, now) -> None:
+        try:
+            stored = dict(SystemSetting.objects.values_list('key', 'value'))
+        except DatabaseError as exc:
+            # Sin tabla (migración pendiente) o BD caída: se conservan los
+            # últimos valores conocidos y se reintenta tras el TTL.
+            logger.warning(f"No se pudo leer system_settings: {exc}")
+            if self._values is None:
+                self._values = dict(DEFAULTS)
+            self._checked = now
+            return
+        if version is None:
+            # Versión expulsada de la caché: se publica una para los demás workers
+            version = uuid.uuid4().hex
+            cache.add(VERSION_CACHE_KEY, version, timeout=None)
+        self._values  = {**DEFAULTS, **{k: v for k, v in stored.items() if k in DEFAULTS}}
+        self._version = version
+        self._checked = self._loaded = now
+
+    def update(self, data: dict, user=None) -> dict:
+        """Persiste las claves conocidas de data y publica una versión nueva."""
+        changes = {k: v for k, v in data.items() if k in DEFAULTS}
+        with transaction.atomic():
+            for key, value in changes.items():
+                SystemSetting.objects.update_or_create(
+                    key=key, defaults={'value': value, 'updated_by': user},
+                )
+            transaction.on_commit(self._publish)
+        return self.get()
+
+    def _publish(self) -> None:
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        with self._lock:
+            self._values = None
+
+
+SETTINGS = SystemSettingsCache()
+
+
+def get_system_settings() -> dict:
+    return SETTINGS.get()
+
+
+def update_system_settings(data: dict, user=None) -> dict:
+    return SETTINGS.update(data, user)
@@ -1,3 +1,15 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .outbox import SENDER, enqueue_email
+
+
+class OutboxSenderStartTests(TestCase):
+    """El hilo emisor solo arranca desde wsgi.py / asgi.py."""
+
+    def test_app_import_does_not_start_sender(self):
+        self.assertFalse(SENDER.running)
+
+    def test_enqueue_does_not_start_sender(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_email('Asunto', 'Cuerpo', ['test@example.com'])
+        self.assertFalse(SENDER.running)
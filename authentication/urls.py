@@ -60,6 +60,7 @@ urlpatterns = [
     path('admin/invitations/<int:invitation_id>/', views.revoke_invitation, name='revoke_invitation'),
     path('admin/stats/', views.get_dashboard_stats, name='get_dashboard_stats'),
     path('admin/activity/', views.get_recent_activity, name='get_recent_activity'),
+    path('admin/request-stats/', views.request_stats, name='request_stats'),
 
     # Configuraciones del sistema
     path('admin/settings/', views.system_settings, name='system_settings'),
@@ -7,8 +7,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Count
@@ -30,7 +30,12 @@ from .serializers import (
     DashboardStatsSerializer,
     UserActivitySerializer
 )
-from .models import User, Invitation, UserActivity, AdminRequest
+from .models import User, Invitation, UserActivity, AdminRequest, USER_STATES
+from .pagination import AdminListPagination
+from .activity_log import log_activity
+from .outbox import enqueue_email
+from .system_settings import get_system_settings, update_system_settings
+from tree_of_science.request_stats import STORE as REQUEST_STATS
 
 # =============== UTILIDADES ===============
 
@@ -49,7 +54,7 @@ def get_client_ip(request):
     )
 
 def send_verification_email(user, request):
-    """Envía email de verificación"""
+    """Encola email de verificación (envío en segundo plano)"""
     token = user.generate_verification_token()
     verification_url = f"http://localhost:3000/verify-email?token={token}"
     
@@ -71,20 +76,14 @@ def send_verification_email(user, request):
     '''
     
     try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [user.email])
         return True
     except Exception as e:
-        print(f"Error enviando email de verificación: {e}")
+        print(f"Error encolando email de verificación: {e}")
         return False
 
 def send_invitation_email(invitation, request):
-    """Envía email de invitación"""
+    """Encola email de invitación (envío en segundo plano)"""
     registration_url = f"http://localhost:5173/register?token={invitation.token}"
     
     subject = 'Invitación para unirse a Tree of Science'
@@ -105,24 +104,18 @@ def send_invitation_email(invitation, request):
     '''
     
     try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [invitation.email],
-            fail_silently=False,
-        )
+        enqueue_email(subject, message, [invitation.email])
         return True
     except Exception as e:
-        print(f"Error enviando email de invitación: {e}")
+        print(f"Error encolando email de invitación: {e}")
         return False
 
 def log_user_activity(user, activity_type, description, request=None):
-    """Registra actividad de usuario"""
-    return UserActivity.objects.create(
-        user=user,
-        activity_type=activity_type,
-        description=description,
+    """Registra actividad de usuario (escritura diferida por lotes, ver activity_log)"""
+    return log_activity(
+        user,
+        activity_type,
+        description,
         ip_address=get_client_ip(request) if request else None,
         user_agent=request.META.get('HTTP_USER_AGENT') if request else None,
     )
@@ -244,7 +237,7 @@ def login(request):
     """
     # Chequeo de modo mantenimiento
     email = (request.data.get('email') or '').strip().lower()
-    if maintenance := CURRENT_SYSTEM_SETTINGS.get("system_maintenance", False):
+    if maintenance := get_system_settings().get("system_maintenance", False):
         user = None
         with contextlib.suppress(User.DoesNotExist):
             user = User.objects.get(email=email)
@@ -517,8 +510,8 @@ def forgot_password(request):
             # URL de recuperación
             reset_url = f"http://localhost:5173/reset-password?token={token}&user_id={user.id}"
 
-            # Enviar email
-            send_mail(
+            # Encolar email (lo entrega authentication.outbox)
+            enqueue_email(
                 'Recuperación de contraseña - Tree of Science',
                 f'''
                 Hola {user.get_full_name()},
@@ -533,9 +526,7 @@ def forgot_password(request):
                 Saludos,
                 Equipo de Tree of Science
                 ''',
-                settings.DEFAULT_FROM_EMAIL,
                 [email],
-                fail_silently=False,
             )
 
             # Registrar actividad
@@ -813,9 +804,12 @@ def admin_users_list(request):
         else:
             users = users.filter(is_staff=False)
 
-    serializer = UserSerializer(users, many=True)
+    paginator = AdminListPagination()
+    page = paginator.paginate(users, request, ordering=('-date_joined', '-id'))
+    serializer = UserSerializer(users if page is None else page, many=True)
     return Response({
-        'users': serializer.data
+        'users': serializer.data,
+        **paginator.links(),
     })
 
 
@@ -1017,30 +1011,39 @@ def get_admin_requests(request):
     - search: buscar por nombre o email
     """
     
-    # Query base
-    queryset = AdminRequest.objects.all().order_by('-created_at')
-
-    # Filtro por estado
+    # Filtros del listado; los contadores por estado son globales
+    filters = Q()
     status_filter = request.query_params.get('status')
     if status_filter and status_filter != 'all':
-        queryset = queryset.filter(status=status_filter)
+        filters &= Q(status=status_filter)
 
     if search := request.query_params.get('search'):
-        queryset = queryset.filter(
+        filters &= (
             Q(first_name__icontains=search) |
             Q(last_name__icontains=search) |
             Q(email__icontains=search)
         )
 
-    # Serializar
-    serializer = AdminRequestSerializer(queryset, many=True)
+    # Todos los contadores en una sola consulta (agregación condicional)
+    counts = AdminRequest.objects.aggregate(
+        count=Count('id', filter=filters),
+        pending_count=Count('id', filter=Q(status='pending')),
+        approved_count=Count('id', filter=Q(status='approved')),
+        rejected_count=Count('id', filter=Q(status='rejected')),
+    )
+
+    queryset = AdminRequest.objects.filter(filters).order_by('-created_at')
+    paginator = AdminListPagination()
+    page = paginator.paginate(queryset, request)
+    serializer = AdminRequestSerializer(queryset if page is None else page, many=True)
 
     return Response({
-        'count': queryset.count(),
+        'count': counts['count'],
         'results': serializer.data,
-        'pending_count': AdminRequest.objects.filter(status='pending').count(),
-        'approved_count': AdminRequest.objects.filter(status='approved').count(),
-        'rejected_count': AdminRequest.objects.filter(status='rejected').count(),
+        **paginator.links(),
+        'pending_count': counts['pending_count'],
+        'approved_count': counts['approved_count'],
+        'rejected_count': counts['rejected_count'],
     }, status=status.HTTP_200_OK)
 
 
@@ -1128,16 +1131,10 @@ def review_admin_request(request, request_id):
                     "Equipo Árbol de la Ciencia"
                 )
 
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[admin_request.email],
-                fail_silently=False,
-            )
+            enqueue_email(subject, message, [admin_request.email])
         except Exception as e:
             # No romper la API si el envío de email falla
-            print(f"⚠️ Error enviando correo de revisión de solicitud: {e}")
+            print(f"⚠️ Error encolando correo de revisión de solicitud: {e}")
 
         # Serializar la solicitud actualizada
         serializer = AdminRequestSerializer(admin_request)
@@ -1249,17 +1246,25 @@ def get_invitations(request):
         invitations = Invitation.objects.filter(
             inviter=request.user
         ).exclude(state='CANCELLED').order_by('-created_at')
-    
-    serializer = InvitationSerializer(invitations, many=True)
+
+    counts = invitations.aggregate(
+        total=Count('id'),
+        pending_count=Count('id', filter=Q(state='PENDING')),
+        accepted_count=Count('id', filter=Q(state='ACCEPTED')),
+        expired_count=Count('id', filter=Q(state='EXPIRED')),
+        cancelled_count=Count('id', filter=Q(state='CANCELLED')),
+    )
+
+    invitations = invitations.select_related('inviter')
+    paginator = AdminListPagination()
+    page = paginator.paginate(invitations, request)
+    serializer = InvitationSerializer(invitations if page is None else page, many=True)
     
     # ✅ CAMBIO: Retornar { invitations: [...] } en lugar de [...]
     return Response({
         'invitations': serializer.data,  # ← Array dentro de objeto
-        'total': invitations.count(),
-        'pending_count': invitations.filter(state='PENDING').count(),
-        'accepted_count': invitations.filter(state='ACCEPTED').count(),
-        'expired_count': invitations.filter(state='EXPIRED').count(),
-        'cancelled_count': invitations.filter(state='CANCELLED').count(),
+        **paginator.links(),
+        **counts,
     })
 
 
@@ -1287,25 +1292,37 @@ def revoke_invitation(request, invitation_id):
 
 # =============== VISTAS DE ESTADÍSTICAS DEL DASHBOARD ===============
 
+DASHBOARD_STATS_CACHE_KEY = 'dashboard_stats'
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_dashboard_stats(request):
+    # Caché compartida con TTL corto: el dashboard se refresca a menudo y
+    # unos segundos de retraso en los contadores son aceptables.
+    cached = cache.get(DASHBOARD_STATS_CACHE_KEY)
+    if cached is not None:
+        return Response(cached)
+
     # 1. Calculamos los datos manualmente
     
+    # Una consulta por tabla: los contadores de usuarios por agregación condicional
+    user_counts = User.objects.aggregate(
+        total_users=Count('id'),
+        admin_users=Count('id', filter=Q(is_staff=True)),
+        **{state: Count('id', filter=Q(user_state=state)) for state, _ in USER_STATES},
+    )
     data = {
-        'total_users': User.objects.count(),
-        'admin_users': User.objects.filter(is_staff=True).count(),
+        'total_users': user_counts.pop('total_users'),
+        'admin_users': user_counts.pop('admin_users'),
         'active_invitations': Invitation.objects.filter(state='PENDING').count(),
         'pending_requests': AdminRequest.objects.filter(status='pending').count(),
-        'users_by_status': {
-            item['user_state']: item['total'] 
-            for item in User.objects.values('user_state').annotate(total=Count('user_state'))
-        }
+        'users_by_status': {state: total for state, total in user_counts.items() if total},
     }
 
     # 2. Se los pasamos al serializer para que los valide y formatee
     serializer = DashboardStatsSerializer(data=data)
     if serializer.is_valid():
+        cache.set(DASHBOARD_STATS_CACHE_KEY, serializer.data, settings.CACHE_TTL['DASHBOARD_STATS'])
         return Response(serializer.data)
     return Response(serializer.errors, status=400)
 
@@ -1318,13 +1335,25 @@ def get_recent_activity(request):
     serializer = UserActivitySerializer(activities, many=True)
     return Response(serializer.data)
 
-# Valores por defecto (coinciden con AdminSettings.jsx)
-SYSTEM_SETTINGS_DEFAULTS = {
-    "system_maintenance": False,
-}
+# =============== ESTADÍSTICAS DE PETICIONES (ADMIN) ===============
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def request_stats(request):
+    """
+    GET    /auth/admin/request-stats/ -> consultas SQL, render y bytes por vista
+    DELETE /auth/admin/request-stats/ -> reinicia los agregados del proceso
+    """
+    if not request.user.is_staff and not getattr(request.user, "is_admin", False):
+        return Response(
+            {"error": "No tiene permisos para ver las estadísticas de peticiones"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
 
-# Configuración en memoria (para desarrollo)
-CURRENT_SYSTEM_SETTINGS = SYSTEM_SETTINGS_DEFAULTS.copy()
+    if request.method == 'DELETE':
+        REQUEST_STATS.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response(REQUEST_STATS.snapshot())
 
 @api_view(["GET", "PATCH"])
 @permission_classes([IsAuthenticated])
@@ -1341,14 +1370,10 @@ def system_settings(request):
         )
 
     if request.method == "GET":
-        return Response(CURRENT_SYSTEM_SETTINGS)
-
-    data = request.data or {}
-    for key, value in data.items():
-        if key in CURRENT_SYSTEM_SETTINGS:
-            CURRENT_SYSTEM_SETTINGS[key] = value
+        return Response(get_system_settings())
 
-    return Response(CURRENT_SYSTEM_SETTINGS, status=status.HTTP_200_OK)
+    current = update_system_settings(request.data or {}, user=request.user)
+    return Response(current, status=status.HTTP_200_OK)
 
 # =============== HERRAMIENTAS DE BASE DE DATOS (ADMIN) ===============
 
@@ -4,8 +4,19 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.http import HttpResponse, Http404
+from tree_of_science.metrics import counter, histogram, size_bucket
 from .models import Bibliography
 from .serializers import BibliographySerializer, BibliographyListSerializer
+import os
+
+UPLOADS = counter(
+    'tos_bibliography_uploads_total', 'Subidas de bibliografía por formato y resultado',
+    ('format', 'status'),
+)
+UPLOAD_SECONDS = histogram(
+    'tos_bibliography_upload_seconds', 'Duración de la subida (validación + guardado)',
+    ('format', 'size'),
+)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -24,11 +35,17 @@ def bibliography_upload(request):
     """
     Subir un archivo de bibliografía
     """
-    serializer = BibliographySerializer(data=request.data, context={'request': request})
-    if serializer.is_valid():
-        bibliography = serializer.save()
-        return Response(BibliographyListSerializer(bibliography, context={'request': request}).data, 
-                       status=status.HTTP_201_CREATED)
+    upload = request.FILES.get('archivo')
+    fmt  = os.path.splitext(upload.name)[1].lower() if upload else ''
+    size = size_bucket(upload.size if upload else 0)
+    with UPLOAD_SECONDS.labels(format=fmt, size=size).time():
+        serializer = BibliographySerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            bibliography = serializer.save()
+            UPLOADS.labels(format=fmt, status='ok').inc()
+            return Response(BibliographyListSerializer(bibliography, context={'request': request}).data, 
+                           status=status.HTTP_201_CREATED)
+    UPLOADS.labels(format=fmt, status='invalid').inc()
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
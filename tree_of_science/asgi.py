@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tree_of_science.settings')
 
 application = get_asgi_application()
+
+# Hilo emisor de la bandeja de correo: solo en procesos que sirven peticiones
+from authentication.outbox import start_background_sender  # noqa: E402
+
+start_background_sender()
@@ -0,0 +1,257 @@
+"""
+Registro de métricas en proceso con exposición en formato texto Prometheus.
+
+API compatible con el subconjunto habitual de prometheus_client
+(Counter / Histogram / Gauge con .labels(...)), sin dependencia externa:
+
+    BUILDS = counter('tos_tree_builds_total', 'Árboles generados', ('format', 'status'))
+    BUILDS.labels(format='.csv', status='ok').inc()
+
+Las métricas viven en la memoria de cada proceso worker: con varios workers
+el scraper ve el proceso que atiende cada petición a /metrics (o cada worker
+se scrapea por separado).
+
+/metrics solo responde a las IPs de settings.METRICS_ALLOWED_IPS
+(por defecto localhost).
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Buckets por defecto (segundos), pensados para peticiones API y builds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _fmt_value(v: float) -> str:
+    if v == math.inf:
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name       = name
+        self.doc        = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+        self._lock      = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Métrica sin etiquetas: un único hijo
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, names, key):
+        return [f'{name}{_fmt_labels(names, key)} {_fmt_value(self.value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def track_inprogress(self):
+        return self._default().track_inprogress()
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts  = [0] * len(buckets)
+        self.sum     = 0.0
+        self.count   = 0
+        self._lock   = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum   += value
+            self.count += 1
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def render(self, name, names, key):
+        lines, cumulative = [], 0
+        for upper, n in zip(self.buckets, self.counts):
+            cumulative += n
+            le = 'le="%s"' % _fmt_value(upper)
+            lines.append(f'{name}_bucket{_fmt_labels(names, key, le)} {cumulative}')
+        lines.append(f'{name}_sum{_fmt_labels(names, key)} {_fmt_value(self.sum)}')
+        lines.append(f'{name}_count{_fmt_labels(names, key)} {self.count}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Idempotente: recargas de módulo reutilizan la métrica existente
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, documentation, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def size_bucket(num_bytes: int) -> str:
+    """Etiqueta de tamaño de archivo de baja cardinalidad para métricas."""
+    mb = (num_bytes or 0) / (1024 * 1024)
+    if mb < 1:
+        return '<1MB'
+    if mb < 5:
+        return '1-5MB'
+    return '5-15MB' if mb < 15 else '>15MB'
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MÉTRICAS HTTP (alimentadas por request_stats.RequestStatsMiddleware)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+HTTP_LATENCY = histogram(
+    'tos_http_request_seconds', 'Latencia de peticiones HTTP por vista',
+    ('view', 'method', 'status'),
+)
+HTTP_QUERIES = histogram(
+    'tos_http_db_queries', 'Consultas SQL por petición', ('view',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+def metrics_view(request):
+    """GET /metrics: exposición en formato texto Prometheus 0.0.4."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,223 @@
+"""
+Estadísticas por petición: consultas SQL, tiempo de serialización y tamaño
+de respuesta por vista.
+
+RequestStatsMiddleware mide cada petición y:
+  - alimenta los histogramas Prometheus de tree_of_science.metrics;
+  - acumula agregados por vista en memoria del proceso (snapshot());
+  - registra en el log las peticiones que superan los umbrales de
+    settings.REQUEST_STATS junto con sus consultas más lentas.
+
+Los agregados se exponen a administradores en /auth/admin/request-stats/.
+
+    REQUEST_STATS = {
+        'SLOW_REQUEST_MS': 1000,  # duración total
+        'MAX_QUERIES':     50,    # consultas SQL por petición
+        'TOP_QUERIES':     5,     # consultas lentas que se guardan / registran
+        'RECENT_SLOW':     50,    # peticiones lentas recientes conservadas
+    }
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import HTTP_LATENCY, HTTP_QUERIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SLOW_REQUEST_MS': 1000,
+    'MAX_QUERIES':     50,
+    'TOP_QUERIES':     5,
+    'RECENT_SLOW':     50,
+}
+
+# Longitud máxima del SQL guardado por consulta
+_SQL_MAX_CHARS = 300
+
+
+def _config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_STATS', {})}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# AGREGADOS POR VISTA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _ViewStats:
+    __slots__ = ('count', 'total_ms', 'max_ms', 'queries', 'max_queries',
+                 'query_ms', 'render_ms', 'bytes', 'slow')
+
+    def __init__(self):
+        self.count       = 0
+        self.total_ms    = 0.0
+        self.max_ms      = 0.0
+        self.queries     = 0
+        self.max_queries = 0
+        self.query_ms    = 0.0
+        self.render_ms   = 0.0
+        self.bytes       = 0
+        self.slow        = 0
+
+    def as_dict(self) -> dict:
+        n = self.count or 1
+        return {
+            'count':         self.count,
+            'avg_ms':        round(self.total_ms / n, 2),
+            'max_ms':        round(self.max_ms, 2),
+            'avg_queries':   round(self.queries / n, 2),
+            'max_queries':   self.max_queries,
+            'avg_query_ms':  round(self.query_ms / n, 2),
+            'avg_render_ms': round(self.render_ms / n, 2),
+            'avg_bytes':     self.bytes // n,
+            'slow':          self.slow,
+        }
+
+
+class RequestStatsStore:
+    """Agregados por vista + últimas peticiones lentas (thread-safe)."""
+
+    def __init__(self, recent: int = DEFAULTS['RECENT_SLOW']):
+        self._lock   = threading.Lock()
+        self._views: dict = {}
+        self._recent = deque(maxlen=recent)
+        self.since   = time.time()
+
+    def record(self, entry: dict, slow: bool) -> None:
+        with self._lock:
+            stats = self._views.get(entry['view'])
+            if stats is None:
+                stats = self._views[entry['view']] = _ViewStats()
+            stats.count       += 1
+            stats.total_ms    += entry['ms']
+            stats.max_ms       = max(stats.max_ms, entry['ms'])
+            stats.queries     += entry['queries']
+            stats.max_queries  = max(stats.max_queries, entry['queries'])
+            stats.query_ms    += entry['query_ms']
+            stats.render_ms   += entry['render_ms']
+            stats.bytes       += entry['bytes'] or 0
+            if slow:
+                stats.slow += 1
+                self._recent.append(entry)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            views = {name: s.as_dict() for name, s in self._views.items()}
+            recent = list(self._recent)
+        return {
+            'since':       self.since,
+            'views':       dict(sorted(views.items(), key=lambda kv: -kv[1]['avg_ms'])),
+            'slow_recent': recent[::-1],
+            'thresholds':  {k: v for k, v in _config().items() if k != 'RECENT_SLOW'},
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+            self._recent.clear()
+            self.since = time.time()
+
+
+STORE = RequestStatsStore(_config()['RECENT_SLOW'])
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MIDDLEWARE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _QueryRecorder:
+    """execute_wrapper que cuenta consultas y conserva las top_n más lentas."""
+
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self.count = 0
+        self.total = 0.0
+        self.top: list = []   # [(segundos, sql)], ordenada desc y acotada
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.count += 1
+            self.total += elapsed
+            if self.top_n and (len(self.top) < self.top_n or elapsed > self.top[-1][0]):
+                self.top.append((elapsed, sql))
+                self.top.sort(key=lambda q: -q[0])
+                del self.top[self.top_n:]
+
+
+class RequestStatsMiddleware:
+    """
+    Mide duración, consultas SQL (número, tiempo y las más lentas), tiempo de
+    render de la respuesta DRF y bytes devueltos, etiquetado por vista
+    (nombre de URL resuelto).
+
+    Cuenta las consultas con connection.execute_wrapper, así que funciona
+    también con DEBUG=False.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cfg      = _config()
+        recorder = _QueryRecorder(cfg['TOP_QUERIES'])
+        request._stats_render = [None, 0.0]   # [inicio, duración] del render
+
+        t0 = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - t0
+
+        match = getattr(request, 'resolver_match', None)
+        view  = (match.url_name or match.view_name) if match else 'unresolved'
+        HTTP_LATENCY.labels(
+            view=view, method=request.method, status=response.status_code
+        ).observe(elapsed)
+        HTTP_QUERIES.labels(view=view).observe(recorder.count)
+
+        entry = {
+            'view':      view,
+            'method':    request.method,
+            'path':      request.path,
+            'status':    response.status_code,
+            'ms':        round(elapsed * 1000, 2),
+            'queries':   recorder.count,
+            'query_ms':  round(recorder.total * 1000, 2),
+            'render_ms': round(request._stats_render[1] * 1000, 2),
+            # Respuestas en streaming (descargas) no tienen tamaño conocido
+            'bytes':     None if response.streaming else len(response.content),
+            'at':        time.time(),
+        }
+        slow = entry['ms'] > cfg['SLOW_REQUEST_MS'] or recorder.count > cfg['MAX_QUERIES']
+        if slow:
+            entry['top_queries'] = [
+                {'ms': round(s * 1000, 2), 'sql': sql[:_SQL_MAX_CHARS]} for s, sql in recorder.top
+            ]
+            logger.warning(
+                f"Petición lenta {request.method} {request.path} ({view}): "
+                f"{entry['ms']} ms, {recorder.count} consultas ({entry['query_ms']} ms), "
+                f"render {entry['render_ms']} ms, {entry['bytes']} bytes; "
+                f"top consultas: {entry['top_queries']}"
+            )
+        STORE.record(entry, slow)
+        return response
+
+    def process_template_response(self, request, response):
+        # Las Response de DRF se renderizan justo después de este hook:
+        # el render (serialización a JSON) se mide hasta el post-render callback.
+        timing = getattr(request, '_stats_render', None)
+        if timing is not None:
+            timing[0] = time.perf_counter()
+
+            def _done(rendered):
+                timing[1] = time.perf_counter() - timing[0]
+
+            response.add_post_render_callback(_done)
+        return response
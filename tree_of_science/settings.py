@@ -58,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tree_of_science.request_stats.RequestStatsMiddleware',  # Consultas / render / bytes por vista → /metrics y /auth/admin/request-stats/
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -280,13 +281,25 @@ CORS_ALLOW_HEADERS = [
 PASSWORD_RESET_TIMEOUT = 60 * 60 * 24
 
 # Email configuration (para recuperación de contraseña y envío de invitaciones)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('CORREO', '')
 EMAIL_HOST_PASSWORD = os.getenv('PASSWORD', '')    # <-- y aquí tu contraseña de aplicación de Gmail
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+EMAIL_TIMEOUT = 15  # segundos; el envío ocurre fuera de la petición (authentication/outbox.py)
+
+# Bandeja de salida: las vistas encolan y un hilo por proceso web (arrancado en
+# wsgi.py / asgi.py, nunca en comandos ni tests) entrega por lotes con una sola
+# conexión SMTP. BACKGROUND=0 → hace falta un worker `manage.py send_outbox --loop`.
+EMAIL_OUTBOX = {
+    'BACKGROUND':     os.getenv('EMAIL_OUTBOX_BACKGROUND', '1') == '1',
+    'BATCH_SIZE':     50,
+    'MAX_ATTEMPTS':   5,
+    'BACKOFF_S':      60,
+    'RETENTION_DAYS': int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', '30')),
+}
 
 # Custom user model
 AUTH_USER_MODEL = 'authentication.User'
@@ -316,4 +329,92 @@ else:
 # Bajo carga concurrente (EST-03, EST-04) esto multiplica la latencia.
 # CONN_MAX_AGE=60 mantiene las conexiones abiertas 60s entre requests,
 # eliminando el overhead de handshake TCP+auth en cada llamada.
-DATABASES['default']['CONN_MAX_AGE'] = 60  # segundos
\ No newline at end of file
+DATABASES['default']['CONN_MAX_AGE'] = 60  # segundos
+# ─── Métricas (/metrics) ─────────────────────────────────────────────────────
+# Exposición en formato texto Prometheus para un scraper local. Registro en
+# memoria por proceso (tree_of_science/metrics.py); solo estas IPs pueden leerlo.
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()
+]
+
+# ─── Caché compartida ────────────────────────────────────────────────────────
+# Compartida entre workers: throttling de DRF (alias "default"), estadísticas
+# del dashboard, configuración del sistema y tree_detail serializado ("trees").
+#   CACHE_BACKEND  = file (defecto, workers de la misma máquina) | redis |
+#                    memcached | locmem (solo un proceso, p. ej. tests)
+#   CACHE_LOCATION = directorio (file) o URL/host:puerto del servidor
+_CACHE_BACKENDS = {
+    'file':      'django.core.cache.backends.filebased.FileBasedCache',
+    'redis':     'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'locmem':    'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHE_BACKEND  = os.getenv('CACHE_BACKEND', 'file')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', str(BASE_DIR / '.django_cache'))
+
+
+def _cache_alias(alias: str, timeout: int, max_entries: int) -> dict:
+    config = {
+        'BACKEND':    _CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT':    timeout,
+        'KEY_PREFIX': 'tos',
+    }
+    if CACHE_BACKEND == 'file':
+        # Un directorio por alias: el cull de FileBasedCache es por directorio
+        config['LOCATION'] = os.path.join(CACHE_LOCATION, alias)
+        config['OPTIONS']  = {'MAX_ENTRIES': max_entries}
+    elif CACHE_BACKEND == 'locmem':
+        config['LOCATION'] = alias
+        config['OPTIONS']  = {'MAX_ENTRIES': max_entries}
+    else:
+        config['LOCATION']   = CACHE_LOCATION
+        config['KEY_PREFIX'] = f'tos:{alias}'
+    return config
+
+
+CACHES = {
+    'default': _cache_alias('default', timeout=300, max_entries=5000),
+    'trees':   _cache_alias('trees', timeout=3600, max_entries=200),
+}
+
+# TTL (segundos) de las lecturas cacheadas en vistas
+CACHE_TTL = {
+    'DASHBOARD_STATS': int(os.getenv('CACHE_TTL_DASHBOARD_STATS', '30')),
+}
+
+# ─── Presupuestos de generación de árboles ───────────────────────────────────
+# ScienceTreeBuilder degrada (fast_sap, min_cocitations, sin JW, sin ghost
+# nodes) en vez de rechazar corpus grandes. Opt-in: sin variables de entorno
+# (o con 0) no hay límite y los árboles salen igual que antes.
+TREE_BUILD_BUDGET = {
+    'TIME_S':    float(os.getenv('TREE_BUILD_TIME_BUDGET_S', '0')) or None,
+    'MEMORY_MB': float(os.getenv('TREE_BUILD_MEMORY_BUDGET_MB', '0')) or None,
+}
+
+# ─── Estadísticas por petición (tree_of_science/request_stats.py) ────────────
+# Peticiones por encima de estos umbrales se registran con sus consultas más
+# lentas y quedan en /auth/admin/request-stats/.
+REQUEST_STATS = {
+    'SLOW_REQUEST_MS': int(os.getenv('SLOW_REQUEST_MS', '1000')),
+    'MAX_QUERIES':     int(os.getenv('SLOW_REQUEST_MAX_QUERIES', '50')),
+    'TOP_QUERIES':     5,
+    'RECENT_SLOW':     50,
+}
+
+# ─── Configuración del sistema (authentication/system_settings.py) ───────────
+# Copia por worker: se comprueba la versión compartida cada TTL_S segundos y se
+# relee la tabla como mínimo cada MAX_AGE_S.
+SYSTEM_SETTINGS_CACHE = {
+    'TTL_S':     int(os.getenv('SYSTEM_SETTINGS_TTL_S', '5')),
+    'MAX_AGE_S': int(os.getenv('SYSTEM_SETTINGS_MAX_AGE_S', '300')),
+}
+
+# ─── Registro de actividad (authentication/activity_log.py) ──────────────────
+# Buffer por worker volcado con bulk_create; retención por meses completos
+# (manage.py prune_activities).
+ACTIVITY_LOG = {
+    'BUFFERED':         os.getenv('ACTIVITY_LOG_BUFFERED', '1') == '1',
+    'FLUSH_SIZE':       100,
+    'FLUSH_INTERVAL_S': 2,
+    'RETENTION_MONTHS': int(os.getenv('ACTIVITY_RETENTION_MONTHS', '12')),
+}
@@ -18,9 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),  # Scraper local (METRICS_ALLOWED_IPS)
     path('auth/', include('authentication.urls')),
     path('api/auth/', include('authentication.urls')),  # ✅ NUEVO: URLs API con prefijo /api/auth/
     path('bibliography/', include('bibliography.urls')),
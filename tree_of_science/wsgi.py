@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tree_of_science.settings')
 
 application = get_wsgi_application()
+
+# Hilo emisor de la bandeja de correo: solo en procesos que sirven peticiones
+from authentication.outbox import start_background_sender  # noqa: E402
+
+start_background_sender()
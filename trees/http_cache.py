@@ -0,0 +1,91 @@
+"""
+Caché HTTP de los endpoints de árboles.
+
+  - Peticiones condicionales: ETag fuerte "<id>-<content_hash>[-<variante>]"
+    y Last-Modified = Tree.fecha_actualizado → 304 sin leer arbol_json.
+  - Cache-Control: private, no-cache. Un árbol puede cambiar en la misma URL
+    (tree_reclassify), así que el navegador guarda la respuesta pero la
+    revalida siempre con If-None-Match (304 barato).
+  - Caché de servidor por usuario (alias settings "trees") para los datos
+    serializados de tree_detail. La clave incluye content_hash, así que un
+    árbol reclasificado nunca sirve datos viejos; delete / reclassify
+    cambian además la versión del árbol incluida en la clave.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+CACHE_ALIAS   = 'trees'
+CACHE_CONTROL = 'private, no-cache'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def tree_etag(pk, content_hash, variant: str = '') -> str:
+    tag = f'{pk}-{content_hash}'
+    if variant:
+        tag += '-' + hashlib.sha1(variant.encode('utf-8')).hexdigest()[:12]
+    return f'"{tag}"'
+
+
+def content_etag(payload: bytes) -> str:
+    """ETag fuerte de un cuerpo ya calculado (listados)."""
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """HttpResponse 304 si la petición condicional coincide; si no, None."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_cache_headers(response, etag, last_modified)
+    return response
+
+
+def set_cache_headers(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+# ─── Caché de servidor por usuario ────────────────────────────────────────────
+# Cada árbol tiene una versión (token aleatorio) que forma parte de la clave;
+# invalidar = publicar un token nuevo, así que las entradas anteriores quedan
+# inalcanzables y expiran solas. Sin listas mutables de claves: no hay
+# get-modificar-set que pueda perder entradas con peticiones concurrentes.
+# Si la versión se expulsa de la caché se genera otra (nunca se reutiliza).
+
+def _version_key(user_id, pk) -> str:
+    return f'tree:{user_id}:{pk}:version'
+
+
+def _tree_version(cache, user_id, pk) -> str:
+    key = _version_key(user_id, pk)
+    cache.add(key, uuid.uuid4().hex, timeout=None)   # atómico: solo si no existe
+    return cache.get(key) or ''
+
+
+def detail_cache_key(user_id, pk, content_hash, variant: str = '') -> str:
+    digest  = hashlib.sha1(variant.encode('utf-8')).hexdigest()[:12] if variant else 'full'
+    version = _tree_version(_cache(), user_id, pk)
+    return f'tree:{user_id}:{pk}:{version}:{content_hash}:{digest}'
+
+
+def get_detail(key):
+    return _cache().get(key)
+
+
+def set_detail(key, data) -> None:
+    _cache().set(key, data)
+
+
+def invalidate_tree(user_id, pk) -> None:
+    """Invalida todas las respuestas cacheadas de un árbol (delete / reclassify)."""
+    _cache().set(_version_key(user_id, pk), uuid.uuid4().hex, timeout=None)
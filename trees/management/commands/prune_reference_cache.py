@@ -0,0 +1,21 @@
+"""
+Management command para aplicar el límite LRU de la caché de referencias
+Ejecutar: python manage.py prune_reference_cache [--max-entries N]
+"""
+from django.core.management.base import BaseCommand
+
+from trees.reference_cache import DBReferenceCache
+
+
+class Command(BaseCommand):
+    help = 'Borrar las referencias canónicas menos usadas por encima del límite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-entries', type=int, default=None,
+                            help='Filas a conservar (por defecto el de DBReferenceCache)')
+
+    def handle(self, *args, **options):
+        cache = DBReferenceCache() if options['max_entries'] is None \
+            else DBReferenceCache(max_entries=options['max_entries'])
+        deleted = cache.evict()
+        self.stdout.write(self.style.SUCCESS(f'Referencias canónicas borradas: {deleted}'))
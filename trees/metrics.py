@@ -0,0 +1,33 @@
+"""
+Métricas de generación de árboles (registro en tree_of_science.metrics).
+"""
+from tree_of_science.metrics import counter, gauge, histogram
+
+TREE_BUILDS = counter(
+    'tos_tree_builds_total', 'Generaciones de árbol por formato y resultado',
+    ('format', 'status'),
+)
+BUILD_SECONDS = histogram(
+    'tos_tree_build_seconds', 'Duración de la generación completa del árbol',
+    ('format', 'size'),
+)
+BUILDS_IN_PROGRESS = gauge(
+    'tos_tree_builds_in_progress', 'Generaciones en curso en este proceso (profundidad de cola)',
+)
+STAGE_SECONDS = histogram(
+    'tos_builder_stage_seconds', 'Duración por etapa de ScienceTreeBuilder (parse = parsers)',
+    ('stage', 'format'),
+)
+EXPORT_SECONDS = histogram(
+    'tos_tree_export_seconds', 'Tiempo de render de exportaciones', ('format',),
+)
+
+
+class StageMetricsHook:
+    """Hook de ScienceTreeBuilder: observa la duración de cada etapa."""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+
+    def stage_end(self, name: str, metrics: dict) -> None:
+        STAGE_SECONDS.labels(stage=name, format=self.fmt).observe(metrics['wall_s'])
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trees', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceCanonical',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha1(formato|referencia normalizada)', max_length=40, unique=True)),
+                ('fmt', models.CharField(max_length=8)),
+                ('canonical', models.TextField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('last_used', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Referencia canónica',
+                'verbose_name_plural': 'Referencias canónicas',
+                'db_table': 'reference_canonical',
+                'indexes': [models.Index(fields=['last_used'], name='reference_c_last_us_4dcc9f_idx')],
+            },
+        ),
+    ]
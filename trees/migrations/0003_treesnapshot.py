@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trees', '0002_referencecanonical'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('tree', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='trees.tree')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de árbol',
+                'verbose_name_plural': 'Snapshots de árboles',
+                'db_table': 'tree_snapshot',
+            },
+        ),
+    ]
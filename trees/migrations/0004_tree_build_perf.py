@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trees', '0003_treesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tree',
+            name='build_perf',
+            field=models.JSONField(blank=True, default=dict, help_text='Métricas por etapa de ScienceTreeBuilder (_perf)'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:05
+
+import hashlib
+import json
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def arbol_json_hash(arbol_json):
+    # Copia de trees.models.arbol_json_hash (las migraciones no importan código vivo)
+    canonical = json.dumps(arbol_json, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def backfill(apps, schema_editor):
+    Tree = apps.get_model('trees', 'Tree')
+    Tree.objects.update(fecha_actualizado=F('fecha_generado'))
+    for tree in Tree.objects.only('id', 'arbol_json').iterator(chunk_size=100):
+        Tree.objects.filter(pk=tree.pk).update(content_hash=arbol_json_hash(tree.arbol_json))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trees', '0004_tree_build_perf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tree',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', help_text='sha1 de arbol_json (ETag)', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='tree',
+            name='fecha_actualizado',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Última modificación (Last-Modified)'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
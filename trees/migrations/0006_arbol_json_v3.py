@@ -0,0 +1,83 @@
+# Reescribe los arbol_json v2.0 (links como lista de {source, target} por id)
+# al esquema v3.0 (links como arrays paralelos de índices de nodo), para que
+# tree_detail / tree_download devuelvan un único formato de enlaces.
+
+import hashlib
+import json
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def arbol_json_hash(arbol_json):
+    # Copia de trees.models.arbol_json_hash (las migraciones no importan código vivo)
+    canonical = json.dumps(arbol_json, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def to_v3(arbol_json):
+    # Copia de trees.serializers.encode_links
+    nodes = arbol_json.get('nodes') or []
+    index = {}
+    for i, node in enumerate(nodes):
+        node['index'] = i
+        index[str(node.get('id'))] = i
+    sources, targets = [], []
+    for link in arbol_json.get('links') or []:
+        si, ti = index.get(str(link.get('source'))), index.get(str(link.get('target')))
+        if si is not None and ti is not None:
+            sources.append(si)
+            targets.append(ti)
+    arbol_json['links'] = {'source': sources, 'target': targets}
+    metadata = arbol_json.setdefault('metadata', {})
+    metadata['algorithm_version'] = '3.0'
+    metadata['link_encoding'] = 'index_arrays'
+    metadata['total_links'] = len(sources)
+
+
+def to_v2(arbol_json):
+    nodes = arbol_json.get('nodes') or []
+    ids = [node.get('id') for node in nodes]
+    links = arbol_json.get('links') or {}
+    arbol_json['links'] = [
+        {'source': ids[s], 'target': ids[t]}
+        for s, t in zip(links.get('source', []), links.get('target', []))
+    ]
+    for node in nodes:
+        node.pop('index', None)
+    metadata = arbol_json.setdefault('metadata', {})
+    metadata['algorithm_version'] = '2.0'
+    metadata.pop('link_encoding', None)
+
+
+def _rewrite(apps, convert, needs_conversion):
+    Tree = apps.get_model('trees', 'Tree')
+    now = timezone.now()
+    for tree in Tree.objects.only('id', 'arbol_json').iterator(chunk_size=50):
+        data = tree.arbol_json
+        if not isinstance(data, dict) or not needs_conversion(data.get('links')):
+            continue
+        convert(data)
+        # update(): sin save() hay que mantener a mano content_hash (ETag) y fecha_actualizado
+        Tree.objects.filter(pk=tree.pk).update(
+            arbol_json=data, content_hash=arbol_json_hash(data), fecha_actualizado=now,
+        )
+
+
+def forwards(apps, schema_editor):
+    _rewrite(apps, to_v3, lambda links: isinstance(links, list))
+
+
+def backwards(apps, schema_editor):
+    _rewrite(apps, to_v2, lambda links: isinstance(links, dict))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trees', '0005_tree_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
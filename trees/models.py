@@ -1,7 +1,17 @@
+import hashlib
+import json
+
 from django.db import models
 from django.conf import settings
 from bibliography.models import Bibliography
 
+
+def arbol_json_hash(arbol_json) -> str:
+    """sha1 del arbol_json en forma canónica (claves ordenadas, sin espacios)."""
+    canonical = json.dumps(arbol_json, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
 class Tree(models.Model):
     """
     Modelo para almacenar árboles de la ciencia generados
@@ -12,12 +22,67 @@ class Tree(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='trees')
     seed = models.TextField(help_text="Semilla utilizada para generar el árbol")
     title = models.CharField(max_length=255, blank=True, help_text="Título del árbol generado")
+    build_perf = models.JSONField(default=dict, blank=True, help_text="Métricas por etapa de ScienceTreeBuilder (_perf)")
+    content_hash = models.CharField(max_length=40, blank=True, default='', help_text="sha1 de arbol_json (ETag)")
+    fecha_actualizado = models.DateTimeField(auto_now=True, help_text="Última modificación (Last-Modified)")
     
     def __str__(self):
         return f"Árbol {self.id} - {self.user.email} - {self.fecha_generado.strftime('%Y-%m-%d')}"
+
+    def save(self, *args, **kwargs):
+        # content_hash acompaña siempre a arbol_json (generación y reclassify)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'arbol_json' in update_fields:
+            self.content_hash = arbol_json_hash(self.arbol_json)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_hash', 'fecha_actualizado'}
+        super().save(*args, **kwargs)
     
     class Meta:
         db_table = 'tree'
         verbose_name = 'Árbol de la Ciencia'
         verbose_name_plural = 'Árboles de la Ciencia'
-        ordering = ['-fecha_generado']
\ No newline at end of file
+        ordering = ['-fecha_generado']
+
+class ReferenceCanonical(models.Model):
+    """
+    Caché persistente de canonicalización de referencias entre builds.
+
+    Mapea un string de referencia normalizado (por formato) al string canónico
+    elegido por el deduplicador Jaro-Winkler. Se evicta por LRU (last_used).
+    """
+    key = models.CharField(max_length=40, unique=True, help_text="sha1(formato|referencia normalizada)")
+    fmt = models.CharField(max_length=8)
+    canonical = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.fmt} {self.canonical[:60]}"
+
+    class Meta:
+        db_table = 'reference_canonical'
+        verbose_name = 'Referencia canónica'
+        verbose_name_plural = 'Referencias canónicas'
+        indexes = [
+            models.Index(fields=['last_used']),
+        ]
+
+class TreeSnapshot(models.Model):
+    """
+    Grafo post-LCC sin clasificar de un árbol (ScienceTreeBuilder.dump_snapshot).
+
+    Permite re-ajustar top_*_limit, leaf_window y max_nodes re-ejecutando solo
+    clasificación + recorte, sin volver a parsear la bibliografía.
+    """
+    tree = models.OneToOneField(Tree, on_delete=models.CASCADE, related_name='snapshot')
+    data = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Snapshot árbol {self.tree_id} ({len(self.data)} bytes)"
+
+    class Meta:
+        db_table = 'tree_snapshot'
+        verbose_name = 'Snapshot de árbol'
+        verbose_name_plural = 'Snapshots de árboles'
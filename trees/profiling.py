@@ -0,0 +1,41 @@
+"""
+Captura de perfiles de CPU por petición (solo administradores).
+
+tree_generate acepta ?profile=cprofile|pyinstrument: la generación completa
+se ejecuta bajo el perfilador y el informe de texto vuelve en la respuesta.
+pyinstrument es opcional; si no está instalado se usa cProfile.
+"""
+import cProfile
+import io
+import pstats
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+except ImportError:
+    _Pyinstrument = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+TOP_FUNCTIONS = 40
+
+
+def run_profiled(fn, mode: str = 'cprofile'):
+    """
+    Ejecuta fn() bajo el perfilador pedido.
+    → (resultado, {"profiler": nombre efectivo, "report": texto})
+    """
+    if mode == 'pyinstrument' and _Pyinstrument is not None:
+        profiler = _Pyinstrument()
+        profiler.start()
+        try:
+            result = fn()
+        finally:
+            profiler.stop()
+        return result, {'profiler': 'pyinstrument', 'report': profiler.output_text()}
+
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(fn)
+    finally:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    return result, {'profiler': 'cprofile', 'report': out.getvalue()}
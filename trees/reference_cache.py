@@ -0,0 +1,124 @@
+"""
+Caché persistente de canonicalización de referencias (tabla reference_canonical).
+
+ScienceTreeBuilder la consulta antes de ejecutar Jaro-Winkler: los strings de
+referencia vistos en builds anteriores (de cualquier usuario) reciben su
+canónico directamente y JW solo procesa los nuevos.
+
+Eviction LRU: cada hit actualiza last_used y evict() borra las filas usadas
+hace más tiempo por encima de max_entries. evict() cuenta la tabla, así que
+store() solo lo llama cada EVICT_EVERY_ROWS filas escritas por el proceso
+(la tabla no puede pasarse de max_entries en más que eso por worker);
+`python manage.py prune_reference_cache` lo aplica bajo demanda / cron.
+"""
+import hashlib
+import logging
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ReferenceCanonical
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(ref_str: str) -> str:
+    """Espacios colapsados + casefold: variantes triviales comparten clave."""
+    return " ".join(ref_str.split()).casefold()
+
+
+def _key(ref_str: str, fmt: str) -> str:
+    return hashlib.sha1(f"{fmt}|{_normalize(ref_str)}".encode("utf-8")).hexdigest()
+
+
+class DBReferenceCache:
+    """
+    Implementación sobre el ORM de Django del contrato ref_cache de
+    ScienceTreeBuilder:
+      lookup(strings, fmt) → {string: canónico} para los strings conocidos
+      store(mapa, fmt)     → persiste {string: canónico}
+      remap(mapa, fmt)     → reescribe {canónico viejo: nuevo} cuando JW une
+                             clases que ya estaban en la caché
+
+    Los errores de base de datos se registran y se degradan a "caché vacía":
+    el build nunca falla por la caché.
+    """
+
+    BATCH = 1000
+    EVICT_EVERY_ROWS = 20_000
+
+    # Filas escritas por este proceso desde el último evict() (compartido
+    # entre instancias: serializers crea una por build)
+    _written_since_evict = 0
+
+    def __init__(self, max_entries: int = 500_000):
+        self.max_entries = max_entries
+
+    def lookup(self, ref_strings: list, fmt: str) -> dict:
+        keys = {}
+        for s in ref_strings:
+            keys.setdefault(_key(s, fmt), []).append(s)
+
+        found: dict = {}
+        key_list = list(keys)
+        try:
+            for i in range(0, len(key_list), self.BATCH):
+                chunk = key_list[i:i + self.BATCH]
+                rows = ReferenceCanonical.objects.filter(key__in=chunk).values_list('key', 'canonical')
+                hit_keys = []
+                for key, canonical in rows:
+                    hit_keys.append(key)
+                    for s in keys[key]:
+                        found[s] = canonical
+                if hit_keys:
+                    ReferenceCanonical.objects.filter(key__in=hit_keys).update(
+                        hits=F('hits') + 1, last_used=timezone.now()
+                    )
+        except DatabaseError as e:
+            logger.warning(f"Caché de referencias no disponible (lookup): {e}")
+            return {}
+        return found
+
+    def store(self, mapping: dict, fmt: str) -> None:
+        if not mapping:
+            return
+        rows = {}
+        for s, canonical in mapping.items():
+            rows.setdefault(_key(s, fmt), canonical)
+        objs = [ReferenceCanonical(key=k, fmt=fmt, canonical=c) for k, c in rows.items()]
+        try:
+            with transaction.atomic():
+                ReferenceCanonical.objects.bulk_create(
+                    objs, batch_size=self.BATCH, ignore_conflicts=True
+                )
+            # Cota superior (ignore_conflicts no dice cuántas se insertaron)
+            DBReferenceCache._written_since_evict += len(objs)
+            if DBReferenceCache._written_since_evict >= self.EVICT_EVERY_ROWS:
+                self.evict()
+        except DatabaseError as e:
+            logger.warning(f"Caché de referencias no disponible (store): {e}")
+
+    def remap(self, mapping: dict, fmt: str) -> None:
+        # Poco frecuente (solo al unir clases ya cacheadas): un UPDATE por canónico destino
+        targets: dict = {}
+        for old, new in mapping.items():
+            targets.setdefault(new, []).append(old)
+        try:
+            with transaction.atomic():
+                for new, olds in targets.items():
+                    ReferenceCanonical.objects.filter(fmt=fmt, canonical__in=olds).update(canonical=new)
+        except DatabaseError as e:
+            logger.warning(f"Caché de referencias no disponible (remap): {e}")
+
+    def evict(self) -> int:
+        """Borra las entradas menos usadas recientemente por encima de max_entries."""
+        DBReferenceCache._written_since_evict = 0
+        excess = ReferenceCanonical.objects.count() - self.max_entries
+        if excess <= 0:
+            return 0
+        stale = list(
+            ReferenceCanonical.objects.order_by('last_used').values_list('id', flat=True)[:excess]
+        )
+        deleted, _ = ReferenceCanonical.objects.filter(id__in=stale).delete()
+        return deleted
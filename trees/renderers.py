@@ -0,0 +1,81 @@
+"""
+Renderer JSON para los endpoints de árboles.
+
+arbol_json puede pesar varios MB. TreeJSONRenderer evita el ciclo
+decodificar (driver) → codificar (json stdlib) de dos formas:
+
+  - RawJSON: fragmento de JSON ya codificado (p. ej. arbol_json::text leído
+    directamente de PostgreSQL) que se inserta tal cual en la respuesta.
+  - orjson (opcional) como codificador del resto de la respuesta; sin él se
+    usa el JSONEncoder de DRF.
+"""
+import json
+import uuid
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Codificador rápido opcional (fallback a json stdlib si no está instalado)
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+
+class RawJSON:
+    """Texto JSON ya codificado (str o bytes) que el renderer inserta sin re-codificar."""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def encode(self) -> bytes:
+        return self.text.encode('utf-8') if isinstance(self.text, str) else bytes(self.text)
+
+
+class TreeJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer compacto que acepta RawJSON en cualquier punto de los datos.
+
+    Cada RawJSON se codifica como un marcador único y después se sustituye
+    por su texto en los bytes ya codificados, sin pasar por objetos Python.
+    Solo aplica cuando no se pide indentación (DRF browsable / ?indent).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(_decode_raw(data), accepted_media_type, renderer_context)
+
+        fragments: list = []
+        token = f'__rawjson_{uuid.uuid4().hex}_'
+
+        def default(obj):
+            if isinstance(obj, RawJSON):
+                fragments.append(obj)
+                return f'{token}{len(fragments) - 1}'
+            return JSONEncoder().default(obj)
+
+        if _orjson is not None:
+            body = _orjson.dumps(data, default=default, option=_orjson.OPT_NON_STR_KEYS)
+        else:
+            body = json.dumps(
+                data, default=default, ensure_ascii=False, allow_nan=False,
+                separators=(',', ':'),
+            ).encode('utf-8')
+
+        for i, fragment in enumerate(fragments):
+            body = body.replace(f'"{token}{i}"'.encode('ascii'), fragment.encode(), 1)
+        return body
+
+
+def _decode_raw(data):
+    """Sustituye RawJSON por su valor decodificado (rutas poco frecuentes)."""
+    if isinstance(data, RawJSON):
+        return json.loads(data.text)
+    if isinstance(data, dict):
+        return {k: _decode_raw(v) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_decode_raw(v) for v in data]
+    return data
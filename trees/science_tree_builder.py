@@ -23,8 +23,7 @@ CHANGELOG:
          por tipo de nodo (root→in_degree, leaf→out_degree, trunk/branch→in×out).
   v8 — Filtros de élite para raíces y hojas: minor_root / minor_leaf,
        top_root_limit=20, top_leaf_limit=25. CLI: --root-limit / --leaf-limit.
-  v9 — [Este archivo]
-       FIX ScopusBibParser._entry: "references": [] hardcodeado → has_refs=False
+  v9 — FIX ScopusBibParser._entry: "references": [] hardcodeado → has_refs=False
        → MetadataOnlyClassifier generaba nodos con valores decimales en lugar
        del árbol estructural real.
        Cambios en _entry:
@@ -34,11 +33,49 @@ CHANGELOG:
           lógica que ScopusCSVParser._parse_refs; ya no hardcodeado como [].
        3. "_refs_strings": refs_strings — strings crudos separados por ";",
           campo que faltaba y es necesario para Jaro-Winkler y ghost nodes.
+  v10 — [Este archivo]
+       JaroWinklerDeduplicator.build_duplicates: Union-Find indexado por enteros
+       sobre arrays NumPy (union-by-rank + path compression completa) y
+       aplanado vectorizado a canónico; sin dicts con claves string.
+       ReferenceBlocker: blocking multi-clave (legacy, apellido+año, DOI,
+       año+vol+pág, sorted-neighborhood) con tope de tamaño de bloque y
+       estadísticas de comparaciones en G.graph["_perf"]["jw_blocking"].
+       ref_cache: caché persistente de canonicalización entre builds; JW solo
+       procesa referencias no vistas antes.
+       MinHashLSHDeduplicator: motor alternativo (use_jaro_winkler="minhash")
+       con candidatos MinHash + LSH por bandas; compare_dedup_engines() y
+       CLI --dedup-report comparan calidad/velocidad frente al JW por bloques.
+       Ghost nodes en dos pases sin estructuras intermedias (_iter_ghost_nodes):
+       sin lista global de referencias ni mapa paper→refs; rid y apellido se
+       calculan una vez por string canónico.
+       _prune_min_degree: k-core correcto por peeling O(V+E) sobre CSR
+       (_kcore_peel) con borrado en bloque; antes solo actualizaba el grado
+       del primer vecino de cada nodo eliminado.
+       LCC y _apply_max_nodes filtran in-place con remove_nodes_from: el
+       pipeline nunca mantiene más de una copia del grafo.
+       _WccTracker: componentes débiles mantenidas con union-find durante
+       _build_graph (sin weakly_connected_components posterior);
+       lcc_top_k conserva las K mayores componentes.
+       finalize_scope="visible": recorte antes de PageRank; PageRank y
+       atributos finales solo sobre el subárbol visible.
+       _top_k (heapq.nlargest, empates estables) compartido por las élites de
+       classify y el recorte de _apply_max_nodes: O(N log K) en vez de sorts
+       completos, mismos conjuntos de nodos.
+       keep_snapshot / reclassify(): snapshot post-LCC comprimido para
+       re-ajustar top_*_limit, leaf_window y max_nodes sin re-ejecutar parseo,
+       JW, ghost nodes ni construcción del grafo.
+       Instrumentación por etapa: perf["stages"] (pared, CPU, pico RSS,
+       contadores) y hooks stage_start/stage_end (StageProfiler: tracemalloc).
+       Presupuestos time_budget_s / memory_budget_mb: tras el parseo se
+       proyecta el coste restante (_BUDGET_COST) y, si no cabe, se degrada en
+       orden fast_sap → min_cocitations ×2 → sin JW → sin ghost nodes;
+       las degradaciones quedan en perf["degradations"].
 """
 
 
-import csv, io, re, os, time, networkx as nx
-from collections import defaultdict, Counter, deque as _deque
+import csv, heapq, io, json, re, os, time, zlib, networkx as nx
+import numpy as np
+from collections import defaultdict, Counter
 from typing import Optional
 
 # Aceleración opcional con rapidfuzz (fallback al Python puro si no está disponible)
@@ -48,6 +85,12 @@ try:
 except ImportError:
     _HAS_RAPIDFUZZ = False
 
+# Pico de RSS del proceso (solo Unix; en Windows las etapas omiten rss_peak_mb)
+try:
+    import resource as _resource
+except ImportError:
+    _resource = None
+
 # Aumentar el límite de tamaño de campo CSV para archivos con campos grandes
 # (el límite por defecto es 128KB, puede fallar con bibliografías grandes)
 csv.field_size_limit(10 * 1024 * 1024)  # 10MB
@@ -592,6 +635,191 @@ class ScopusRISParser:
         }
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# UNION-FIND INDEXADO POR ENTEROS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _UnionFind:
+    """
+    Union-Find sobre arrays NumPy indexados por entero (0..n-1).
+
+    · union-by-rank + path compression completa → find amortizado ~O(α(n)).
+    · Memoria fija: 8 bytes (parent) + 1 byte (rank) por elemento, sin dicts
+      con claves string.
+    · canonical(): aplanado vectorizado que devuelve, para cada elemento, el
+      menor índice de su componente (reproducible, independiente del orden
+      de las uniones).
+    """
+
+    __slots__ = ("parent", "rank")
+
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int64)
+        self.rank   = np.zeros(n, dtype=np.int8)
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        # Path compression completa: todo el camino apunta a la raíz
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return int(root)
+
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        rank = self.rank
+        if rank[ra] < rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if rank[ra] == rank[rb]:
+            rank[ra] += 1
+        return True
+
+    def roots(self) -> np.ndarray:
+        """Aplana el bosque (parent[i] = raíz) con saltos de puntero vectorizados."""
+        p = self.parent
+        while True:
+            gp = p[p]
+            if np.array_equal(gp, p):
+                break
+            p = gp
+        self.parent = p
+        return p
+
+    def canonical(self) -> np.ndarray:
+        """canon[i] = menor índice de la componente de i."""
+        roots = self.roots()
+        n     = len(roots)
+        rep   = np.full(n, n, dtype=np.int64)
+        np.minimum.at(rep, roots, np.arange(n, dtype=np.int64))
+        return rep[roots]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BLOCKING MULTI-CLAVE PARA DEDUPLICACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_WOS_YEAR_RE = re.compile(r'^\d{4}$')
+_WOS_VOL_RE  = re.compile(r'\bV(\d+)\b')
+_WOS_PAGE_RE = re.compile(r'\bP(\d+)\b')
+_WOS_DOI_RE  = re.compile(r'DOI\s+(10\.\S+)', re.IGNORECASE)
+_CSV_YEAR_RE = re.compile(r'\((\d{4})\)')
+_CSV_VOL_RE  = re.compile(r',\s*(\d{1,5})\s*(?:\(\d+\))?\s*,\s*(?:pp\.|art\.|\d)', re.IGNORECASE)
+_CSV_PAGE_RE = re.compile(r'pp\.\s*(\d+)')
+_CSV_DOI_RE  = re.compile(r'10\.\d{4,}/\S+')
+
+
+def _tokenize_ref(ref_str: str, fmt: str) -> tuple:
+    """
+    Extrae los campos de una referencia cruda en un solo pase.
+
+    Devuelve (apellido, año, volumen, página, doi) como strings normalizados
+    ("" si el campo no existe). fmt=".txt" → WoS CR; cualquier otro → Scopus.
+    """
+    ref_str = (ref_str or "").strip()
+    first   = ref_str.split(",", 1)[0].split()
+    surname = re.sub(r'\W+', '', first[0]).lower() if first else ""
+    if fmt == ".txt":
+        parts = ref_str.split(",", 2)
+        year  = parts[1].strip()[:4] if len(parts) > 1 else ""
+        year  = year if _WOS_YEAR_RE.match(year) else ""
+        vm, pm = _WOS_VOL_RE.search(ref_str), _WOS_PAGE_RE.search(ref_str)
+        dm    = _WOS_DOI_RE.search(ref_str)
+        doi   = dm[1].rstrip(",. ").lower() if dm else ""
+    else:
+        ym    = _CSV_YEAR_RE.search(ref_str)
+        year  = ym[1] if ym else ""
+        vm, pm = _CSV_VOL_RE.search(ref_str), _CSV_PAGE_RE.search(ref_str)
+        dm    = _CSV_DOI_RE.search(ref_str)
+        doi   = dm[0].rstrip(",. )").lower() if dm else ""
+    return (surname, year, vm[1] if vm else "", pm[1] if pm else "", doi)
+
+
+class ReferenceBlocker:
+    """
+    Genera bloques de candidatos para el deduplicador JW.
+
+    Cada referencia emite VARIAS claves (una por estrategia activa), de modo
+    que un error tipográfico en un campo no separa duplicados verdaderos:
+      legacy         : clave histórica apellido(6)+año+vol/pág (_key_wos/_key_csv)
+      surname_year   : prefijo de apellido + año
+      doi            : DOI normalizado
+      year_vol_page  : año + volumen + página (tolera errores en el apellido)
+      neighborhood   : ventana deslizante sobre todas las referencias ordenadas
+                       (sorted-neighborhood global; desactivada por defecto)
+
+    Bloques con más de max_bucket elementos no se comparan todos contra todos:
+    se recorren con sorted-neighborhood (cada string contra sus `window`
+    siguientes en orden lexicográfico) → peor caso O(n·window) por bloque.
+
+    last_stats guarda las estadísticas de comparaciones del último build.
+    """
+
+    KEYS = ("legacy", "surname_year", "doi", "year_vol_page", "neighborhood")
+
+    def __init__(self,
+                 keys: tuple = ("legacy", "surname_year", "doi", "year_vol_page"),
+                 max_bucket: int = 200,
+                 window: int = 20,
+                 surname_prefix: int = 4):
+        unknown = set(keys) - set(self.KEYS)
+        if unknown:
+            raise ValueError(f"Claves de blocking desconocidas: {', '.join(sorted(unknown))}")
+        self.keys           = tuple(keys)
+        self.max_bucket     = max_bucket
+        self.window         = window
+        self.surname_prefix = surname_prefix
+        self.last_stats: dict = {}
+
+    def keys_for(self, ref_str: str, fmt: str, fields: Optional[tuple] = None) -> list:
+        """Claves de bloque (con prefijo de estrategia) de una referencia."""
+        surname, year, vol, page, doi = fields or _tokenize_ref(ref_str, fmt)
+        out: list = []
+        for k in self.keys:
+            if k == "legacy":
+                legacy = (JaroWinklerDeduplicator._key_wos(ref_str) if fmt == ".txt"
+                          else JaroWinklerDeduplicator._key_csv(ref_str))
+                out.append(f"legacy:{legacy}")
+            elif k == "surname_year" and surname and year:
+                out.append(f"surname_year:{surname[:self.surname_prefix]}_{year}")
+            elif k == "doi" and doi:
+                out.append(f"doi:{doi}")
+            elif k == "year_vol_page" and year and vol and page:
+                out.append(f"year_vol_page:{year}_{vol}_{page}")
+        return out
+
+    def blocks(self, labels: list, fmt: str):
+        """
+        Generador de (estrategia, índices, exhaustivo).
+
+        `labels` debe venir ordenado; los índices de cada bloque salen en
+        orden creciente (= orden lexicográfico). exhaustivo=False indica que
+        el bloque se recorre con sorted-neighborhood de ancho `window`.
+        """
+        buckets: dict = defaultdict(list)
+        for i, lbl in enumerate(labels):
+            for key in self.keys_for(lbl, fmt):
+                buckets[key].append(i)
+
+        for key, idxs in buckets.items():
+            if len(idxs) > 1:
+                yield key.split(":", 1)[0], idxs, len(idxs) <= self.max_bucket
+        if "neighborhood" in self.keys and len(labels) > 1:
+            yield "neighborhood", list(range(len(labels))), False
+
+    def pairs(self, idxs: list, exhaustive: bool):
+        """Pares (i, j) a comparar dentro de un bloque."""
+        n = len(idxs)
+        span = n if exhaustive else self.window + 1
+        for a in range(n):
+            for b in range(a + 1, min(a + span, n)):
+                yield idxs[a], idxs[b]
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # DEDUPLICADOR JARO-WINKLER (con bucketing eficiente)
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -600,12 +828,16 @@ class JaroWinklerDeduplicator:
     """
     Fusiona variantes tipográficas de la misma referencia.
 
-    Bucketing por (apellido + año + vol/pág) → O(n·k) comparaciones.
+    Blocking multi-clave (ReferenceBlocker) con tope de tamaño de bloque
+    → O(n·k) comparaciones con k acotado.
     Guards DOI/año/volumen previenen fusiones erróneas entre papers distintos.
     """
 
-    def __init__(self, threshold: float = 0.96):
-        self.threshold = threshold
+    def __init__(self, threshold: float = 0.96,
+                 blocker: Optional["ReferenceBlocker"] = None):
+        self.threshold  = threshold
+        self.blocker    = blocker or ReferenceBlocker()
+        self.last_stats: dict = {}
 
     # ── Jaro-Winkler puro (sin dependencias externas) ──────────────────────────
 
@@ -648,13 +880,17 @@ class JaroWinklerDeduplicator:
         return m.group(1) if m else None
 
     def _should_merge(self, s1: str, s2: str) -> bool:
+        return self._guards_ok(s1, s2) and self.similarity(s1, s2) > self.threshold
+
+    def _guards_ok(self, s1: str, s2: str) -> bool:
+        """DOI / año / volumen no contradictorios (sin calcular la similitud)."""
         d1 = self._extract(r'DOI\s+(\S+)', s1); d2 = self._extract(r'DOI\s+(\S+)', s2)
         if d1 and d2 and d1.lower() != d2.lower(): return False
         y1 = self._extract(r',\s*(\d{4})\s*,', s1); y2 = self._extract(r',\s*(\d{4})\s*,', s2)
         if y1 and y2 and y1 != y2: return False
         v1 = self._extract(r',\s*V(\d+)\s*,', s1); v2 = self._extract(r',\s*V(\d+)\s*,', s2)
         if v1 and v2 and v1 != v2: return False
-        return self.similarity(s1, s2) > self.threshold
+        return True
 
     # ── Claves de bucket por formato ───────────────────────────────────────────
 
@@ -695,58 +931,292 @@ class JaroWinklerDeduplicator:
         return f"{last[:6]}_{year}_{page}"
 
     def build_duplicates(self, labels: list, fmt: str = ".txt") -> dict:
-        """Devuelve {variante → canónico}. Garantiza transitividad vía Union-Find."""
-        key_fn  = self._key_wos if fmt == ".txt" else self._key_csv
-
-        # Union-Find con path compression
-        parent: dict = {}
-        def find(x):
-            while parent.get(x, x) != x:
-                parent[x] = parent.get(parent.get(x, x), parent.get(x, x))
-                x = parent[x]
-            return x
-        def union(a, b):
-            ra, rb = find(a), find(b)
-            if ra != rb:
-                # Canónico = el lexicográficamente menor (reproducible)
-                if ra < rb:
-                    parent[rb] = ra
-                else:
-                    parent[ra] = rb
-
-        buckets: dict = defaultdict(list)
-        for lbl in labels:
-            buckets[key_fn(lbl)].append(lbl)
+        """
+        Devuelve {variante → canónico}. Garantiza transitividad vía Union-Find.
 
-        for bucket in buckets.values():
-            if len(bucket) <= 1:
-                continue
-            sorted_b = sorted(bucket)
-            if _HAS_RAPIDFUZZ and len(sorted_b) > 20:
+        Los candidatos salen de self.blocker (multi-clave); un mismo par que
+        aparece en varios bloques se compara una sola vez. Las estadísticas de
+        comparaciones quedan en self.last_stats.
+        """
+        # Índice entero i ↔ uniq[i] en orden lexicográfico: el menor índice de
+        # cada componente es también el string lexicográficamente menor, así que
+        # el canónico sigue siendo reproducible con union-by-rank.
+        uniq = sorted(set(labels))
+        n    = len(uniq)
+        uf   = _UnionFind(n)
+
+        compared: set = set()
+        per_block: list = []
+        by_key: dict = defaultdict(lambda: {"blocks": 0, "capped": 0, "comparisons": 0})
+        merges = 0
+
+        for key_name, block, exhaustive in self.blocker.blocks(uniq, fmt):
+            comparisons = 0
+            if exhaustive and _HAS_RAPIDFUZZ and len(block) > 20:
                 from rapidfuzz import process as _rfp
                 from rapidfuzz.distance import JaroWinkler as _RFJW
-                matrix = _rfp.cdist(sorted_b, sorted_b,
+                strs   = [uniq[i] for i in block]
+                matrix = _rfp.cdist(strs, strs,
                                  scorer=_RFJW.similarity,
                                  score_cutoff=self.threshold)
-                for i in range(len(sorted_b)):
-                    for j in range(i + 1, len(sorted_b)):
-                        if matrix[i][j] >= self.threshold:
-                            if self._should_merge(sorted_b[i], sorted_b[j]):
-                                union(sorted_b[i], sorted_b[j])
+                # cdist puntúa todos los pares del bloque; como en la rama
+                # Python, cuentan los que no se compararon bajo otra clave.
+                # Claves y conjunto se actualizan en C (sin bucle por par).
+                blk    = np.asarray(block, dtype=np.int64)
+                ia, ib = np.triu_indices(len(block), 1)
+                keys   = (blk[ia] * n + blk[ib]).tolist()
+                seen   = compared.intersection(keys)
+                comparisons = len(keys) - len(seen)
+                compared.update(keys)
+                # Bajo score_cutoff cdist devuelve 0: solo se recorren los aciertos
+                hits = np.nonzero(np.triu(matrix, 1))
+                for a, b in zip(hits[0].tolist(), hits[1].tolist()):
+                    i, j = block[a], block[b]
+                    if i * n + j not in seen and self._should_merge(uniq[i], uniq[j]):
+                        merges += uf.union(i, j)
             else:
-                for i in range(len(sorted_b)):
-                    for j in range(i + 1, len(sorted_b)):
-                        if self._should_merge(sorted_b[i], sorted_b[j]):
-                            union(sorted_b[i], sorted_b[j])
+                for i, j in self.blocker.pairs(block, exhaustive):
+                    if i * n + j in compared:
+                        continue
+                    compared.add(i * n + j)
+                    comparisons += 1
+                    if self._should_merge(uniq[i], uniq[j]):
+                        merges += uf.union(i, j)
+
+            per_block.append(comparisons)
+            stats_k = by_key[key_name]
+            stats_k["blocks"]      += 1
+            stats_k["capped"]      += not exhaustive
+            stats_k["comparisons"] += comparisons
+
+        per_block.sort()
+        self.last_stats = {
+            "labels":                n,
+            "blocks":                len(per_block),
+            "comparisons":           sum(per_block),
+            "merges":                merges,
+            "max_block_comparisons": per_block[-1] if per_block else 0,
+            "p95_block_comparisons": per_block[int(len(per_block) * 0.95)] if per_block else 0,
+            "mean_block_comparisons": round(sum(per_block) / len(per_block), 2) if per_block else 0,
+            "by_key":                {k: dict(v) for k, v in by_key.items()},
+        }
+        self.blocker.last_stats = self.last_stats
 
-        # Construir mapa variante→canónico (solo para no-canónicos)
-        return {lbl: find(lbl) for lbl in labels if find(lbl) != lbl}
+        # Aplanado vectorizado → mapa variante→canónico (solo para no-canónicos)
+        canon   = uf.canonical()
+        changed = np.flatnonzero(canon != np.arange(n))
+        return {uniq[i]: uniq[canon[i]] for i in changed.tolist()}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DEDUPLICADOR APROXIMADO MinHash/LSH (corpus con 200k+ referencias)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_MH_PRIME = np.uint64((1 << 31) - 1)
+
+
+def _lsh_bands(num_perm: int, lsh_threshold: float) -> int:
+    """Divisor de num_perm cuyo umbral LSH (1/b)^(1/r) queda más cerca del objetivo."""
+    divisors = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(divisors,
+               key=lambda b: abs((1 / b) ** (b / num_perm) - lsh_threshold))
+
+
+class MinHashLSHDeduplicator(JaroWinklerDeduplicator):
+    """
+    Variante de JaroWinklerDeduplicator con candidatos por MinHash + LSH.
+
+    · Firma MinHash (num_perm hashes) sobre n-gramas de caracteres del string
+      normalizado; calculada en lotes vectorizados con NumPy.
+    · LSH por bandas (bands × rows = num_perm): dos strings son candidatos si
+      coinciden en al menos una banda → umbral Jaccard ≈ (1/bands)^(1/rows).
+      Por defecto bands se deriva de lsh_threshold (Jaccard de trigramas de
+      pares con JW ≥ 0.96 en referencias típicas): con num_perm=64 da 8×8,
+      umbral ≈ 0.77. Umbrales bajos (16×4 ≈ 0.5) llenan casi todas las
+      cubetas y todo acaba en la ventana de sorted-neighborhood.
+    · Cubetas LSH mayores que max_bucket se recorren con sorted-neighborhood.
+    · Cada candidato se verifica con los mismos guards (_should_merge).
+
+    Coste ~O(n·num_perm) para las firmas + candidatos, sin depender de que
+    apellido/año/volumen estén bien escritos.
+    """
+
+    def __init__(self, threshold: float = 0.96, ngram: int = 3,
+                 num_perm: int = 64, bands: int = None,
+                 lsh_threshold: float = 0.75,
+                 max_bucket: int = 200, window: int = 20, seed: int = 1):
+        if bands is None:
+            bands = _lsh_bands(num_perm, lsh_threshold)
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        super().__init__(threshold)
+        self.ngram      = ngram
+        self.num_perm   = num_perm
+        self.bands      = bands
+        self.max_bucket = max_bucket
+        self.window     = window
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MH_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MH_PRIME), size=num_perm, dtype=np.uint64)
+
+    def _normalize(self, s: str) -> bytes:
+        s = " ".join(re.sub(r'[^\w]+', ' ', s.upper()).split())
+        return s.encode("utf-8").ljust(self.ngram)
+
+    def _signatures(self, labels: list, batch: int = 4000, perm_block: int = 8) -> np.ndarray:
+        """
+        Matriz (n, num_perm) de firmas MinHash, calculada por lotes.
+
+        Los n-gramas de bytes se codifican como enteros directamente sobre el
+        buffer concatenado del lote (sin hashing por n-grama en Python). Las
+        permutaciones se aplican de perm_block en perm_block sobre un buffer
+        reutilizado, así que la memoria pico queda acotada a unas decenas de MB.
+        """
+        n_g = self.ngram
+        sig = np.empty((len(labels), self.num_perm), dtype=np.uint64)
+        for lo in range(0, len(labels), batch):
+            enc    = [self._normalize(s) for s in labels[lo:lo + batch]]
+            lens   = np.fromiter((len(e) for e in enc), dtype=np.int64, count=len(enc))
+            buf    = np.frombuffer(b"".join(enc), dtype=np.uint8).astype(np.uint64)
+            codes  = np.zeros(len(buf) - n_g + 1, dtype=np.uint64)
+            for k in range(n_g):
+                codes = (codes << np.uint64(8)) | buf[k:len(buf) - n_g + 1 + k]
+            # Posiciones válidas: n-gramas que no cruzan el límite entre strings
+            offs   = np.concatenate(([0], np.cumsum(lens)[:-1]))
+            counts = lens - n_g + 1
+            pos    = np.repeat(offs, counts) + (
+                np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            )
+            flat   = codes[pos] % _MH_PRIME
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            del buf, codes, pos
+            # (perm_block, M) reutilizado: el pico no crece con num_perm
+            # (≈ perm_block × batch × 40 n-gramas × 8 B ≈ 10 MB por defecto)
+            hv = np.empty((min(perm_block, self.num_perm), len(flat)), dtype=np.uint64)
+            for p0 in range(0, self.num_perm, perm_block):
+                a, b = self._a[p0:p0 + perm_block], self._b[p0:p0 + perm_block]
+                blk  = hv[:len(a)]
+                np.multiply(a[:, None], flat[None, :], out=blk)
+                blk += b[:, None]
+                blk %= _MH_PRIME
+                sig[lo:lo + len(enc), p0:p0 + len(a)] = np.minimum.reduceat(blk, starts, axis=1).T
+        return sig
+
+    def build_duplicates(self, labels: list, fmt: str = ".txt") -> dict:
+        """Devuelve {variante → canónico}; mismo contrato que JaroWinklerDeduplicator."""
+        uniq = sorted(set(labels))
+        n    = len(uniq)
+        uf   = _UnionFind(n)
+        if n < 2:
+            self.last_stats = {"labels": n, "blocks": 0, "comparisons": 0, "merges": 0}
+            return {}
+
+        sig  = self._signatures(uniq)
+        rows = self.num_perm // self.bands
+
+        compared: set = set()
+        per_block: list = []
+        capped = merges = 0
+        for band in range(self.bands):
+            buckets: dict = defaultdict(list)
+            band_sig = np.ascontiguousarray(sig[:, band * rows:(band + 1) * rows])
+            for i in range(n):
+                buckets[band_sig[i].tobytes()].append(i)   # índices ordenados
+            for idxs in buckets.values():
+                k = len(idxs)
+                if k < 2:
+                    continue
+                span = k if k <= self.max_bucket else self.window + 1
+                capped += k > self.max_bucket
+                comparisons = 0
+                for a in range(k):
+                    for b in range(a + 1, min(a + span, k)):
+                        i, j = idxs[a], idxs[b]
+                        if i * n + j in compared:
+                            continue
+                        compared.add(i * n + j)
+                        comparisons += 1
+                        # Misma condición que _should_merge con la similitud
+                        # primero (una sola vez): los guards por regex solo
+                        # corren sobre pares que ya superan el umbral
+                        if (self.similarity(uniq[i], uniq[j]) > self.threshold
+                                and self._guards_ok(uniq[i], uniq[j])):
+                            merges += uf.union(i, j)
+                per_block.append(comparisons)
+
+        per_block.sort()
+        self.last_stats = {
+            "labels":                n,
+            "blocks":                len(per_block),
+            "capped_blocks":         capped,
+            "comparisons":           sum(per_block),
+            "merges":                merges,
+            "max_block_comparisons": per_block[-1] if per_block else 0,
+            "p95_block_comparisons": per_block[int(len(per_block) * 0.95)] if per_block else 0,
+            "mean_block_comparisons": round(sum(per_block) / len(per_block), 2) if per_block else 0,
+        }
+
+        canon   = uf.canonical()
+        changed = np.flatnonzero(canon != np.arange(n))
+        return {uniq[i]: uniq[canon[i]] for i in changed.tolist()}
+
+
+def compare_dedup_engines(labels: list, fmt: str = ".txt") -> dict:
+    """
+    Reporte calidad/velocidad: MinHash/LSH frente al JW por bloques.
+
+    Toma el JW por bloques como referencia y mide, sobre pares co-agrupados,
+    precisión y recall del motor MinHash, además de tiempos y comparaciones.
+    """
+    def clustered_pairs(dup: dict) -> set:
+        classes: dict = defaultdict(set)
+        for s, c in dup.items():
+            classes[c].update((s, c))
+        return {(a, b) for members in classes.values()
+                for a in members for b in members if a < b}
+
+    report: dict = {"labels": len(set(labels))}
+    results: dict = {}
+    for name, engine in (("bucket_jw", JaroWinklerDeduplicator()),
+                         ("minhash_lsh", MinHashLSHDeduplicator())):
+        t0 = time.perf_counter()
+        results[name] = engine.build_duplicates(labels, fmt=fmt)
+        report[name] = {
+            "seconds":     round(time.perf_counter() - t0, 4),
+            "comparisons": engine.last_stats.get("comparisons", 0),
+            "merged":      len(results[name]),
+        }
+    ref_pairs = clustered_pairs(results["bucket_jw"])
+    mh_pairs  = clustered_pairs(results["minhash_lsh"])
+    common    = len(ref_pairs & mh_pairs)
+    report["pair_precision"] = round(common / len(mh_pairs), 4) if mh_pairs else 1.0
+    report["pair_recall"]    = round(common / len(ref_pairs), 4) if ref_pairs else 1.0
+    return report
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # CLASIFICADOR
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def _top_k(items, k: int, key) -> list:
+    """
+    Los k mayores de items según key, en orden descendente, en O(N log K).
+
+    Equivale exactamente a sorted(items, key=key, reverse=True)[:k]:
+    heapq.nlargest conserva el orden de entrada entre empates, igual que el
+    sort estable con reverse=True.
+    """
+    if k <= 0:
+        return []
+    if k >= len(items):
+        return sorted(items, key=key, reverse=True)
+    return heapq.nlargest(k, items, key=key)
+
+
+# Grupos fuera del árbol visible (ver ScienceTreeClassifier)
+_HIDDEN_GROUPS = frozenset(("dead_leaf", "isolated", "minor_root", "minor_leaf"))
+
+
 class ScienceTreeClassifier:
     """
     Clasifica nodos y calcula SAP (flujo de savia).
@@ -792,7 +1262,14 @@ class ScienceTreeClassifier:
         self.top_root_limit  = top_root_limit
         self.top_leaf_limit  = top_leaf_limit
 
-    def classify(self, G: nx.DiGraph) -> nx.DiGraph:
+    def classify(self, G: nx.DiGraph, visible_only: bool = False) -> nx.DiGraph:
+        """
+        visible_only: True → los atributos finales del paso 7 (_sap_norm,
+        root/trunk/leaf/branch/total_value) solo se escriben en los grupos
+        visibles; los ocultos conservan group y _sap, suficientes para que
+        _apply_max_nodes los descarte. _sap_norm se normaliza igual contra
+        el máximo de todo el grafo.
+        """
         if not G.nodes:
             return G
 
@@ -848,13 +1325,11 @@ class ScienceTreeClassifier:
                 ndata["group"] = "isolated"
 
         # ── 3. Filtro de tronco estricto (Top SAP) ───────────────────────────
-        # Ordenar candidatos de mayor a menor in×out y promover la élite a "trunk"
-        intermedios_ordenados = sorted(
-            intermedios_temp,
+        # Promover a "trunk" la élite de candidatos por in×out
+        trunk_set = set(_top_k(
+            intermedios_temp, self.top_trunk_limit,
             key=lambda x: G.nodes[x]["_sap"],
-            reverse=True
-        )
-        trunk_set = set(intermedios_ordenados[:self.top_trunk_limit])
+        ))
         for n in intermedios_temp:
             if n in trunk_set:
                 G.nodes[n]["group"] = "trunk"
@@ -863,18 +1338,20 @@ class ScienceTreeClassifier:
         # ── 4. Filtro de élite para raíces (Top in_degree) ───────────────────
         # Solo los top_root_limit clásicos más citados permanecen como "root".
         # Los demás reciben "minor_root" y serán eliminados del árbol visible.
-        raices_temp = [n for n, d in G.nodes(data=True) if d.get("group") == "root"]
-        raices_ordenadas = sorted(raices_temp, key=lambda x: in_deg[x], reverse=True)
-        for n in raices_ordenadas[self.top_root_limit:]:
-            G.nodes[n]["group"] = "minor_root"
+        raices_temp  = [n for n, d in G.nodes(data=True) if d.get("group") == "root"]
+        raices_elite = set(_top_k(raices_temp, self.top_root_limit, key=in_deg.__getitem__))
+        for n in raices_temp:
+            if n not in raices_elite:
+                G.nodes[n]["group"] = "minor_root"
 
         # ── 5. Filtro de élite para hojas (Top out_degree) ───────────────────
         # Solo las top_leaf_limit hojas más conectadas permanecen como "leaf".
         # Las demás reciben "minor_leaf" y serán eliminadas del árbol visible.
-        hojas_temp = [n for n, d in G.nodes(data=True) if d.get("group") == "leaf"]
-        hojas_ordenadas = sorted(hojas_temp, key=lambda x: out_deg[x], reverse=True)
-        for n in hojas_ordenadas[self.top_leaf_limit:]:
-            G.nodes[n]["group"] = "minor_leaf"
+        hojas_temp  = [n for n, d in G.nodes(data=True) if d.get("group") == "leaf"]
+        hojas_elite = set(_top_k(hojas_temp, self.top_leaf_limit, key=out_deg.__getitem__))
+        for n in hojas_temp:
+            if n not in hojas_elite:
+                G.nodes[n]["group"] = "minor_leaf"
 
         # ── 6. SAP final O(N): fórmula correcta por tipo de nodo ─────────────
         # IMPORTANTE: sobreescribe el _sap de ranking del paso 2.
@@ -907,6 +1384,8 @@ class ScienceTreeClassifier:
             ndata = G.nodes[n]
             s     = ndata["_sap"]
             g     = ndata["group"]
+            if visible_only and g in _HIDDEN_GROUPS:
+                continue
             ndata["_sap_norm"]   = s / max_sap
             # Compatibilidad con serializer Django (campos root/trunk/leaf históricos).
             # minor_root/minor_leaf heredan los scores de root/leaf para coherencia
@@ -1092,29 +1571,216 @@ class ReferenceNodeExtractor:
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
+def _kcore_peel(indptr, indices, min_deg: int) -> np.ndarray:
+    """
+    Peeling k-core en O(V+E) sobre adyacencia CSR no dirigida.
+
+    indptr/indices describen, para cada nodo i, sus vecinos
+    indices[indptr[i]:indptr[i+1]] (un arco dirigido aparece en ambos
+    extremos, así que grado = in + out como en nx.k_core). Cola de dos
+    cubetas: los nodos bajo el umbral se apilan una sola vez, en el momento
+    en que su grado cruza min_deg; cada arista se descuenta a lo sumo dos
+    veces. Devuelve la máscara booleana de nodos que sobreviven.
+    """
+    indptr  = np.asarray(indptr)
+    n       = len(indptr) - 1
+    deg     = np.diff(indptr)
+    keep    = deg >= min_deg
+    stack   = np.flatnonzero(~keep).tolist()
+    if not stack or min_deg <= 1:
+        # Con min_deg <= 1 solo caen los aislados: no hay cascada
+        return keep
+
+    ptr  = indptr.tolist()
+    nbrs = np.asarray(indices).tolist()
+    d    = deg.tolist()
+    for i in range(n):
+        if not keep[i]:
+            d[i] = -1          # ya en la pila: no vuelve a apilarse
+    while stack:
+        u = stack.pop()
+        for v in nbrs[ptr[u]:ptr[u + 1]]:
+            dv = d[v]
+            if dv < 0: continue
+            dv -= 1
+            if dv < min_deg:
+                d[v] = -1
+                keep[v] = False
+                stack.append(v)
+            else:
+                d[v] = dv
+    return keep
+
+
 def _prune_min_degree(G: nx.DiGraph, min_deg: int) -> nx.DiGraph:
-    """Poda iterativa en O(V+E) usando cola de nodos candidatos."""
-    if min_deg <= 0:
+    """
+    k-core in-place: elimina en bloque todos los nodos que quedan con grado
+    total < min_deg tras el peeling (equivalente a nx.k_core sin copiar el
+    grafo). Requiere que los self-loops se hayan eliminado antes.
+    """
+    if min_deg <= 0 or G.number_of_nodes() == 0:
         return G
-    degree = dict(G.degree())
-    queue  = _deque(n for n, d in degree.items() if d < min_deg)
-    in_queue = set(queue)
-    while queue:
-        n = queue.popleft()
-        in_queue.discard(n)
-        if n not in G:
-            continue
-        for nb in list(G.predecessors(n)) + list(G.successors(n)):
-            G.remove_node(n)
-            if nb in G:
-                degree[nb] = G.degree(nb)
-                if degree[nb] < min_deg and nb not in in_queue:
-                    queue.append(nb)
-                    in_queue.add(nb)
-            break
+    nodes = list(G)
+    if min_deg == 1:
+        G.remove_nodes_from([n for n in nodes if G.degree(n) == 0])
+        return G
+
+    index = {n: i for i, n in enumerate(nodes)}
+    m     = G.number_of_edges()
+    src   = np.fromiter((index[u] for u, _ in G.edges()), dtype=np.int64, count=m)
+    dst   = np.fromiter((index[v] for _, v in G.edges()), dtype=np.int64, count=m)
+    rows  = np.concatenate((src, dst))
+    cols  = np.concatenate((dst, src))
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+
+    keep = _kcore_peel(indptr, cols[order], min_deg)
+    G.remove_nodes_from([nodes[i] for i in np.flatnonzero(~keep).tolist()])
     return G
 
 
+class _WccTracker:
+    """
+    Componentes débilmente conectados mantenidos mientras se insertan aristas.
+
+    Union-by-size + path halving sobre listas Python: en la inserción arista a
+    arista el acceso escalar a listas es más barato que a arrays NumPy (ver
+    _UnionFind, pensado para uniones por lotes). El aplanado final a raíces
+    sí es vectorizado. Los nodos eliminados después (poda de aislados) son
+    componentes unitarias y no invalidan el bosque; si una poda k-core pudo
+    partir componentes, from_graph() lo reconstruye en una pasada de aristas.
+    """
+
+    __slots__ = ("nodes", "index", "parent", "size")
+
+    def __init__(self, nodes):
+        self.nodes  = list(nodes)
+        self.index  = {n: i for i, n in enumerate(self.nodes)}
+        self.parent = list(range(len(self.nodes)))
+        self.size   = [1] * len(self.nodes)
+
+    @classmethod
+    def from_graph(cls, G: nx.DiGraph) -> "_WccTracker":
+        t = cls(G)
+        for u, v in G.edges():
+            t.add_edge(u, v)
+        return t
+
+    def add_edge(self, u, v) -> None:
+        parent = self.parent
+        a, b   = self.index[u], self.index[v]
+        while parent[a] != a:
+            parent[a] = a = parent[parent[a]]
+        while parent[b] != b:
+            parent[b] = b = parent[parent[b]]
+        if a == b:
+            return
+        size = self.size
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a]  += size[b]
+
+    def split(self, G: nx.DiGraph, top_k: int = 1) -> tuple:
+        """
+        → (nodos fuera de las top_k componentes mayores, tamaños desc).
+
+        Solo cuenta los nodos que siguen en G. Empates de tamaño: gana la
+        componente cuyo primer nodo aparece antes en G (mismo criterio que
+        max(nx.weakly_connected_components(G), key=len)).
+        """
+        p = np.asarray(self.parent, dtype=np.int64)
+        while True:
+            gp = p[p]
+            if np.array_equal(gp, p):
+                break
+            p = gp
+        alive  = np.fromiter((n in G for n in self.nodes), dtype=bool, count=len(self.nodes))
+        pos    = np.flatnonzero(alive)
+        labels = p[pos]
+        roots, first, counts = np.unique(labels, return_index=True, return_counts=True)
+        order  = np.lexsort((first, -counts))
+        keep   = np.isin(labels, roots[order[:max(1, top_k)]])
+        drop   = [self.nodes[i] for i in pos[~keep].tolist()]
+        return drop, counts[order]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INSTRUMENTACIÓN POR ETAPA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class StageProfiler:
+    """
+    Hook de ScienceTreeBuilder(hooks=[...]) que añade a cada etapa el pico de
+    memoria Python (tracemalloc) y guarda las métricas en self.stages.
+
+    Contrato de hook (todos los métodos opcionales):
+      stage_start(name)           antes de la etapa
+      stage_end(name, metrics)    después; metrics es mutable y se copia a
+                                  perf["stages"][name]
+    tracemalloc ralentiza la ejecución (~1.5-2×): usar solo al perfilar.
+    Se detiene al terminar "finalize", la última etapa de todo build.
+    """
+
+    def __init__(self):
+        self.stages:   dict = {}
+        self._started: bool = False
+
+    def stage_start(self, name: str) -> None:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        tracemalloc.reset_peak()
+
+    def stage_end(self, name: str, metrics: dict) -> None:
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            metrics["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        self.stages[name] = dict(metrics)
+        if name == "finalize" and self._started:
+            tracemalloc.stop()
+            self._started = False
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PRESUPUESTOS DE TIEMPO / MEMORIA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Coste de cada componente posterior al parseo: (tiempo en múltiplos del
+# tiempo de parseo, memoria en múltiplos del RSS añadido durante el parseo).
+# Medido sobre corpus WoS de 3k y 15k papers; solo orienta la elección de
+# degradaciones, los presupuestos se vuelven a comprobar entre etapas.
+# Los componentes *_ghost escalan con el número de ghost nodes.
+_BUDGET_COST = {
+    "ghost":          (0.45, 0.17),
+    "jw":             (1.00, 0.00),
+    "build":          (0.30, 0.19),
+    "build_ghost":    (0.30, 0.21),
+    "classify":       (0.05, 0.02),
+    "classify_bfs":   (0.10, 0.00),
+    "finalize":       (0.30, 0.19),
+    "finalize_ghost": (0.50, 0.22),
+}
+
+# Escalera de degradación, de menor a mayor pérdida de calidad
+_DEGRADATIONS = ("fast_sap", "min_cocitations", "jaro_winkler", "ghost_nodes")
+
+
+def _rss_mb() -> Optional[float]:
+    """RSS actual del proceso en MB (Linux); fuera de Linux, el pico (ru_maxrss)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        if _resource is None:
+            return None
+        rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
 # CONSTRUCTOR PRINCIPAL
 # ═══════════════════════════════════════════════════════════════════════════════
 
@@ -1131,18 +1797,29 @@ class ScienceTreeBuilder:
                  min_cocitations: int = 1,
                  include_ghost_nodes: bool = True,
                  exclude_self_citations: bool = True,
-                 use_jaro_winkler: bool = True,
+                 use_jaro_winkler=True,
                  fast_sap: bool = True,
                  use_lcc: bool = True,
                  leaf_window: int = 5,
                  top_trunk_limit: int = 30,
                  top_root_limit: int = 20,
                  top_leaf_limit: int = 60,
-                 max_nodes: int = 90):
+                 max_nodes: int = 90,
+                 ref_cache=None,
+                 lcc_top_k: int = 1,
+                 finalize_scope: str = "full",
+                 keep_snapshot: bool = False,
+                 hooks: list | None = None,
+                 time_budget_s: float | None = None,
+                 memory_budget_mb: float | None = None):
         """
         Parámetros:
           min_cocitations  : umbral co-citaciones para ghost nodes.
                              None → auto-escala: max(4, corpus//50).
+          use_jaro_winkler : motor de deduplicación de referencias.
+                             True / "bucket" → JW por bloques (defecto).
+                             "minhash"       → MinHash/LSH + guards JW (200k+ refs).
+                             False           → sin deduplicación.
           fast_sap         : True → SAP O(N) por in×out (defecto, recomendado).
                              False → SAP O(V+E) por BFS, mayor fidelidad ToS.
           use_lcc          : True (defecto) → extrae el mayor componente débilmente
@@ -1152,6 +1829,35 @@ class ScienceTreeBuilder:
           top_root_limit   : máximo de raíces visibles, por in_degree (defecto 10).
           top_leaf_limit   : máximo de hojas visibles, por out_degree (defecto 40).
           max_nodes        : recorte proporcional del grafo final (None = sin límite).
+          ref_cache        : caché persistente string→canónico entre builds
+                             (objeto con lookup(strings, fmt), store(mapa, fmt)
+                             y remap({canónico viejo: nuevo}, fmt), p. ej.
+                             trees.reference_cache.DBReferenceCache).
+                             None → JW sobre todas las referencias en cada build.
+          lcc_top_k        : con use_lcc, número de componentes (las mayores) que
+                             se conservan. Defecto 1 = solo el LCC.
+          finalize_scope   : "full" (defecto) → PageRank y atributos finales
+                             sobre todo el LCC; después recorte max_nodes.
+                             "visible" → la élite root/trunk/branch/leaf
+                             (ranking por grado / in×out de classify) se recorta
+                             primero y PageRank + atributos finales se calculan
+                             solo sobre ese subárbol. pagerank/pagerank_norm son
+                             entonces relativos al subgrafo visible (inducido) y
+                             no coinciden con el modo "full"; group, _sap y
+                             _sap_norm no cambian.
+          keep_snapshot    : True → guarda en self.last_snapshot el grafo
+                             post-LCC (sin clasificar, con PageRank en modo
+                             "full") para reclassify() sin re-parsear.
+          hooks            : objetos con stage_start(name) / stage_end(name,
+                             metrics) llamados en cada etapa (ver StageProfiler).
+          time_budget_s    : presupuesto de tiempo total del build (None = sin
+                             límite).
+          memory_budget_mb : presupuesto de RSS del proceso (None = sin límite).
+                             Con algún presupuesto, si la proyección tras el
+                             parseo no cabe se degrada en orden: fast_sap,
+                             min_cocitations ×2, sin JW, sin ghost nodes
+                             (antes de clasificar solo fast_sap). Nunca se
+                             rechaza el corpus; ver perf["degradations"].
         """
         self.min_degree             = min_degree
         self._min_coc_override      = min_cocitations
@@ -1168,6 +1874,22 @@ class ScienceTreeBuilder:
         self.top_root_limit         = top_root_limit
         self.top_leaf_limit         = top_leaf_limit
         self.max_nodes              = max_nodes
+        self.ref_cache              = ref_cache
+        self.lcc_top_k              = lcc_top_k
+        if finalize_scope not in ("full", "visible"):
+            raise ValueError(
+                f"finalize_scope='{finalize_scope}' no soportado. Use: 'full', 'visible'"
+            )
+        self.finalize_scope         = finalize_scope
+        self.keep_snapshot          = keep_snapshot
+        self.hooks                  = list(hooks or ())
+        self.time_budget_s          = time_budget_s
+        self.memory_budget_mb       = memory_budget_mb
+        self._undegraded: dict      = {}   # parámetros originales antes de degradar
+        self._coc_raises            = 0
+        self._parse_rss_mb          = 0.0
+        self.last_snapshot: bytes | None = None
+        self._wcc: _WccTracker | None = None
         self.clf  = ScienceTreeClassifier(
             fast_sap=fast_sap,
             leaf_window=leaf_window,
@@ -1176,7 +1898,14 @@ class ScienceTreeBuilder:
             top_leaf_limit=top_leaf_limit,
         )
         self.meta = MetadataOnlyClassifier()
-        self.jw   = JaroWinklerDeduplicator()
+        if use_jaro_winkler == "minhash":
+            self.jw = MinHashLSHDeduplicator()
+        elif use_jaro_winkler in (True, False, "bucket"):
+            self.jw = JaroWinklerDeduplicator()
+        else:
+            raise ValueError(
+                f"use_jaro_winkler='{use_jaro_winkler}' no soportado. Use: True, False, 'bucket', 'minhash'"
+            )
 
     # ── Helpers ────────────────────────────────────────────────────────────────
 
@@ -1185,6 +1914,139 @@ class ScienceTreeBuilder:
             return self._min_coc_override
         return max(4, corpus_size // 50)
 
+    def _stage_start(self, name: str) -> tuple:
+        for h in self.hooks:
+            if hasattr(h, "stage_start"):
+                h.stage_start(name)
+        return time.perf_counter(), time.process_time()
+
+    def _stage_end(self, name: str, t0: tuple, perf: dict, **counts) -> None:
+        """
+        Cierra una etapa: perf[name_s] (pared, clave histórica) y
+        perf["stages"][name] = {wall_s, cpu_s, rss_peak_mb, contadores}.
+        """
+        wall = round(time.perf_counter() - t0[0], 4)
+        metrics = {"wall_s": wall, "cpu_s": round(time.process_time() - t0[1], 4), **counts}
+        if _resource is not None:
+            # ru_maxrss: KB en Linux, bytes en macOS
+            rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+            metrics["rss_peak_mb"] = round(rss / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+        for h in self.hooks:
+            if hasattr(h, "stage_end"):
+                h.stage_end(name, metrics)
+        perf[f"{name}_s"] = wall
+        perf.setdefault("stages", {})[name] = metrics
+
+    # ── Presupuestos ───────────────────────────────────────────────────────────
+
+    def _budget_projection(self, pending: tuple, parse_s: float, rss_delta: float) -> tuple:
+        """(segundos, MB) que se estima costarán los componentes pendientes."""
+        ghost_on = self.include_ghost_nodes
+        t = m = 0.0
+        for comp in pending:
+            if comp == "jw" and not self.use_jaro_winkler:
+                continue
+            if comp == "classify_bfs" and self.fast_sap:
+                continue
+            if comp in ("ghost", "jw"):
+                scale = 1.0 if ghost_on else 0.0
+            elif comp.endswith("_ghost"):
+                # Duplicar min_cocitations deja ~70 % del coste (los ghost
+                # nodes más co-citados, que son los que más aristas aportan)
+                scale = 0.7 ** self._coc_raises if ghost_on else 0.0
+            else:
+                scale = 1.0
+            ct, cm = _BUDGET_COST[comp]
+            t += ct * parse_s * scale
+            m += cm * rss_delta * scale
+        return t, m
+
+    def _apply_degradation(self, step: str, perf: dict) -> Optional[tuple]:
+        """Aplica un paso de la escalera; → (antes, después) o None si no aplica."""
+        if step == "fast_sap" and not self.fast_sap:
+            self._undegraded.setdefault("fast_sap", self.fast_sap)
+            self.fast_sap = self.clf.fast_sap = True
+            perf["sap_mode"] = "fast_O(N)"
+            return False, True
+        if not self.include_ghost_nodes:
+            return None
+        if step == "min_cocitations" and not self._coc_raises:
+            before = self.min_cocitations
+            self.min_cocitations = max(2 * before, before + 1)
+            self._coc_raises = 1
+            perf["min_cocitations"] = self.min_cocitations
+            return before, self.min_cocitations
+        if step == "jaro_winkler" and self.use_jaro_winkler:
+            self._undegraded.setdefault("use_jaro_winkler", self.use_jaro_winkler)
+            self.use_jaro_winkler = False
+            perf["dedup_engine"] = "none"
+            return True, False
+        if step == "ghost_nodes":
+            self._undegraded.setdefault("include_ghost_nodes", True)
+            self.include_ghost_nodes = False
+            return True, False
+        return None
+
+    def _check_budget(self, stage: str, pending: tuple, steps: tuple,
+                      t_total: float, perf: dict) -> None:
+        """
+        Punto de control entre etapas: proyecta tiempo y memoria de los
+        componentes pendientes y aplica pasos de `steps` (en orden) mientras
+        la proyección supere algún presupuesto. Un paso solo se aplica si
+        reduce la dimensión que se excede.
+        """
+        parse_s = perf.get("parse_s") or 0.0
+
+        def over() -> tuple:
+            t, m = self._budget_projection(pending, parse_s, self._parse_rss_mb)
+            proj_s  = time.perf_counter() - t_total + t
+            rss     = _rss_mb() if self.memory_budget_mb else None
+            proj_mb = rss + m if rss is not None else None
+            return (
+                bool(self.time_budget_s and proj_s > self.time_budget_s),
+                bool(self.memory_budget_mb and proj_mb is not None and proj_mb > self.memory_budget_mb),
+                proj_s, proj_mb,
+            )
+
+        time_over, mem_over, proj_s, proj_mb = over()
+        projection = perf["budget"].setdefault("projections", {})[stage] = {
+            "projected_s":  round(proj_s, 2),
+            "projected_mb": round(proj_mb, 1) if proj_mb is not None else None,
+        }
+        n_before = len(perf["degradations"])
+        for step in steps:
+            if not (time_over or mem_over):
+                break
+            # Sin efecto en la dimensión excedida (p. ej. fast_sap y memoria): no degradar
+            if not time_over and step in ("fast_sap", "jaro_winkler"):
+                continue
+            change = self._apply_degradation(step, perf)
+            if change is None:
+                continue
+            perf["degradations"].append({
+                "stage":  stage,
+                "action": step,
+                "from":   change[0],
+                "to":     change[1],
+                "reason": "time" if time_over else "memory",
+            })
+            time_over, mem_over, proj_s, proj_mb = over()
+        if len(perf["degradations"]) > n_before:
+            projection["degraded_s"]  = round(proj_s, 2)
+            projection["degraded_mb"] = round(proj_mb, 1) if proj_mb is not None else None
+
+    def _reset_degradations(self) -> None:
+        """Restaura los parámetros degradados por un build anterior."""
+        if "fast_sap" in self._undegraded:
+            self.fast_sap = self.clf.fast_sap = self._undegraded["fast_sap"]
+        if "use_jaro_winkler" in self._undegraded:
+            self.use_jaro_winkler = self._undegraded["use_jaro_winkler"]
+        if "include_ghost_nodes" in self._undegraded:
+            self.include_ghost_nodes = self._undegraded["include_ghost_nodes"]
+        self._undegraded = {}
+        self._coc_raises = 0
+        self._parse_rss_mb = 0.0
+
     # ── Punto de entrada principal ────────────────────────────────────────────
 
     def build_from_file(self, archivo) -> nx.DiGraph:
@@ -1194,6 +2056,8 @@ class ScienceTreeBuilder:
         El grafo resultante incluye G.graph["_perf"] con métricas de rendimiento:
           parse_s        : tiempo de parseo
           ghost_s        : tiempo de ghost nodes + JW
+          jw_comparisons : pares comparados por JW (si se ejecutó)
+          jw_blocking    : estadísticas de blocking por bloque / estrategia
           build_s        : tiempo de construcción del grafo
           lcc_s          : tiempo de extracción LCC
           classify_s     : tiempo de clasificación + SAP
@@ -1203,17 +2067,32 @@ class ScienceTreeBuilder:
           lcc_nodes      : nodos en el LCC
           discarded_lcc  : nodos descartados por LCC
           n_components   : número de componentes débiles
+          component_sizes: tamaños de las 10 mayores componentes (desc)
           sap_mode       : "fast_O(N)" o "bfs_O(V+E)"
           min_cocitations: umbral de co-citación usado
+          finalize_scope : "full" o "visible" (ver __init__)
+          finalize_s     : tiempo de PageRank + recorte max_nodes
+          reclassified   : True si el grafo viene de reclassify()
+          stages         : {etapa: {wall_s, cpu_s, rss_peak_mb, contadores}}
+                           para parse, ghost (ghost_nodes, jw_comparisons),
+                           build (nodes, edges), lcc, classify, finalize
+          budget         : con presupuestos: {time_s, memory_mb, projections,
+                           elapsed_s, exceeded}
+          degradations   : [{stage, action, from, to, reason}] aplicadas
         """
         t_total = time.perf_counter()
+        self.last_snapshot = None
+        self._reset_degradations()
+        budgeted = bool(self.time_budget_s or self.memory_budget_mb)
+        rss_start = _rss_mb() if self.memory_budget_mb else None
         ext = os.path.splitext((getattr(archivo, "name", None) or str(archivo)).lower())[1]
         cls = self.PARSERS.get(ext)
         if not cls:
             raise ValueError(f"Formato '{ext}' no soportado. Use: {', '.join(self.PARSERS)}")
 
         # ── Parseo ────────────────────────────────────────────────────────────
-        t0 = time.perf_counter()
+        perf: dict = {}
+        t0 = self._stage_start("parse")
         if hasattr(archivo, "open"):        # Django FieldFile / pathlib.Path
             opener = archivo.open("rb")
         elif hasattr(archivo, "read"):      # file-like object ya abierto
@@ -1224,7 +2103,7 @@ class ScienceTreeBuilder:
         if opener is not None:
             with opener as f:
                 papers = cls().parse(f)
-        perf: dict = {"parse_s": round(time.perf_counter() - t0, 4)}
+        self._stage_end("parse", t0, perf, papers=len(papers))
         if not papers:
             raise ValueError("El archivo no contiene papers procesables.")
 
@@ -1235,10 +2114,17 @@ class ScienceTreeBuilder:
         perf["corpus_papers"]    = corpus_size
         perf["min_cocitations"]  = self.min_cocitations
         perf["sap_mode"]         = "fast_O(N)" if self.fast_sap else "bfs_O(V+E)"
+        perf["dedup_engine"]     = ("minhash_lsh" if self.use_jaro_winkler == "minhash"
+                                    else "bucket_jw" if self.use_jaro_winkler else "none")
         perf["leaf_window"]      = self.leaf_window
         perf["top_trunk_limit"]  = self.top_trunk_limit
         perf["top_root_limit"]   = self.top_root_limit
         perf["top_leaf_limit"]   = self.top_leaf_limit
+        if budgeted:
+            perf["budget"] = {"time_s": self.time_budget_s, "memory_mb": self.memory_budget_mb}
+            perf["degradations"] = []
+            if rss_start is not None:
+                self._parse_rss_mb = max(_rss_mb() - rss_start, 1.0)
 
         if not has_refs:
             G = self._to_graph(self.meta.classify(papers))
@@ -1253,19 +2139,32 @@ class ScienceTreeBuilder:
                 "n_components": 1,
             }
             return self._finalize_graph(t_total, perf, G)
+        if budgeted:
+            self._check_budget("parse", tuple(_BUDGET_COST), _DEGRADATIONS, t_total, perf)
+
         # ── Ghost nodes ───────────────────────────────────────────────────────
-        t0 = time.perf_counter()
+        t0 = self._stage_start("ghost")
+        self.jw.last_stats = {}
         if self.include_ghost_nodes:
             papers = self._add_ghost_nodes(papers, ext)
-        perf["ghost_s"]       = round(time.perf_counter() - t0, 4)
+        self._stage_end("ghost", t0, perf,
+                        ghost_nodes=len(papers) - corpus_size,
+                        jw_comparisons=self.jw.last_stats.get("comparisons", 0))
         perf["total_papers"]  = len(papers)
+        if self.jw.last_stats:
+            perf["jw_comparisons"] = self.jw.last_stats["comparisons"]
+            perf["jw_blocking"]    = self.jw.last_stats
 
         # ── Construcción del grafo ────────────────────────────────────────────
-        t0 = time.perf_counter()
+        t0 = self._stage_start("build")
         G  = self._build_graph(papers)
         G.remove_edges_from(list(nx.selfloop_edges(G)))
+        n_built = G.number_of_nodes()
         G = _prune_min_degree(G, self.min_degree)
-        perf["build_s"] = round(time.perf_counter() - t0, 4)
+        if self._wcc is not None and self.min_degree > 1 and G.number_of_nodes() < n_built:
+            # El k-core pudo partir componentes: reconstruir sobre lo que queda
+            self._wcc = _WccTracker.from_graph(G)
+        self._stage_end("build", t0, perf, nodes=G.number_of_nodes(), edges=G.number_of_edges())
 
         if G.number_of_nodes() == 0 or G.number_of_edges() == 0:
             G2 = self._to_graph(self.meta.classify(papers))
@@ -1278,41 +2177,154 @@ class ScienceTreeBuilder:
             }
             return self._finalize_graph(t_total, perf, G2)
         # ── LCC: mayor componente débilmente conectado ────────────────────────
-        t0 = time.perf_counter()
+        t0 = self._stage_start("lcc")
         if self.use_lcc:
-            components      = list(nx.weakly_connected_components(G))
-            lcc_nodes       = max(components, key=len)
+            # Componentes ya conocidas desde _build_graph: sin recorrido extra
+            drop, sizes     = self._wcc.split(G, self.lcc_top_k)
             n_before        = G.number_of_nodes()
-            G               = G.subgraph(lcc_nodes).copy()   # libera memoria
-            perf["n_components"]   = len(components)
+            # Filtrado in-place: el grafo es propio del pipeline, no se copia
+            G.remove_nodes_from(drop)
+            self._wcc       = None
+            perf["n_components"]    = len(sizes)
+            perf["component_sizes"] = sizes[:10].tolist()
             perf["lcc_nodes"]      = G.number_of_nodes()
             perf["discarded_lcc"]  = n_before - G.number_of_nodes()
         else:
             perf["n_components"]   = 1
             perf["lcc_nodes"]      = G.number_of_nodes()
             perf["discarded_lcc"]  = 0
-        perf["lcc_s"] = round(time.perf_counter() - t0, 4)
+        self._stage_end("lcc", t0, perf, nodes=G.number_of_nodes(), edges=G.number_of_edges())
+
+        if budgeted:
+            self._check_budget(
+                "lcc", ("classify", "classify_bfs", "finalize", "finalize_ghost"),
+                ("fast_sap",), t_total, perf,
+            )
 
         # ── Clasificación + SAP ───────────────────────────────────────────────
-        t0 = time.perf_counter()
-        G  = self.clf.classify(G)
-        perf["classify_s"] = round(time.perf_counter() - t0, 4)
+        t0 = self._stage_start("classify")
+        G  = self.clf.classify(G, visible_only=self.finalize_scope == "visible")
+        self._stage_end("classify", t0, perf, nodes=G.number_of_nodes())
 
-        return self._finalize_graph(t_total, perf, G)
+        return self._finalize_graph(t_total, perf, G, snapshot=self.keep_snapshot)
+
+    def reclassify(self, snapshot: bytes) -> nx.DiGraph:
+        """
+        Re-ejecuta solo clasificación, PageRank y recorte max_nodes sobre un
+        snapshot post-LCC (ver keep_snapshot), con los parámetros actuales del
+        builder (top_*_limit, leaf_window, max_nodes, fast_sap...).
+
+        El resultado es el mismo que un build_from_file completo con esos
+        parámetros: ninguno de ellos afecta a parseo, JW, ghost nodes ni LCC.
+        En modo "full" el PageRank guardado en el snapshot se reutiliza (solo
+        depende de la estructura del LCC, no de la clasificación).
+        """
+        t_total = time.perf_counter()
+        self._reset_degradations()
+        G, perf = self.load_snapshot(snapshot)
+        if any(d["action"] == "fast_sap" for d in perf.get("degradations", ())):
+            # El build original degradó a SAP O(N): mantenerlo para que solo
+            # cambien los parámetros re-ajustados
+            self._apply_degradation("fast_sap", perf)
+        perf |= {
+            "sap_mode":        "fast_O(N)" if self.fast_sap else "bfs_O(V+E)",
+            "leaf_window":     self.leaf_window,
+            "top_trunk_limit": self.top_trunk_limit,
+            "top_root_limit":  self.top_root_limit,
+            "top_leaf_limit":  self.top_leaf_limit,
+            "reclassified":    True,
+        }
+        perf.pop("stages", None)
+        t0 = self._stage_start("classify")
+        G  = self.clf.classify(G, visible_only=self.finalize_scope == "visible")
+        self._stage_end("classify", t0, perf, nodes=G.number_of_nodes())
+        return self._finalize_graph(
+            t_total, perf, G, pagerank_done=G.graph.pop("_has_pagerank", False)
+        )
+
+    # ── Snapshot post-LCC ─────────────────────────────────────────────────────
+
+    # Atributos previos a la clasificación (+ PageRank, que no depende de ella)
+    _SNAPSHOT_ATTRS = (
+        "label", "title", "authors", "year", "doi", "times_cited", "url",
+        "source", "_is_ghost", "pagerank", "pagerank_norm",
+    )
+
+    @classmethod
+    def dump_snapshot(cls, G: nx.DiGraph, perf: dict) -> bytes:
+        """
+        Grafo post-LCC → bytes: [4 bytes: len(cabecera)] + cabecera JSON
+        (perf + nodos con atributos) + aristas como pares int32 de índices de
+        nodo; ambas partes comprimidas con zlib.
+        """
+        index = {n: i for i, n in enumerate(G)}
+        head  = zlib.compress(json.dumps({
+            "v":     1,
+            "perf":  {k: v for k, v in perf.items() if k not in ("total_s", "finalize_s", "stages")},
+            "nodes": [[n, {k: d[k] for k in cls._SNAPSHOT_ATTRS if k in d}]
+                      for n, d in G.nodes(data=True)],
+        }, separators=(",", ":"), default=str).encode("utf-8"))
+        m     = G.number_of_edges()
+        edges = np.fromiter((index[x] for e in G.edges() for x in e), dtype=np.int32, count=2 * m)
+        return len(head).to_bytes(4, "big") + head + zlib.compress(edges.tobytes())
+
+    @staticmethod
+    def load_snapshot(blob: bytes) -> tuple:
+        """→ (grafo sin clasificar, perf de las etapas de construcción)."""
+        blob  = bytes(blob)
+        n     = int.from_bytes(blob[:4], "big")
+        data  = json.loads(zlib.decompress(blob[4:4 + n]))
+        edges = np.frombuffer(zlib.decompress(blob[4 + n:]), dtype=np.int32).tolist()
+        nodes = data["nodes"]
+        ids   = [nid for nid, _ in nodes]
+        G = nx.DiGraph()
+        G.add_nodes_from((nid, attrs) for nid, attrs in nodes)
+        G.add_edges_from(zip(map(ids.__getitem__, edges[0::2]), map(ids.__getitem__, edges[1::2])))
+        G.graph["_has_pagerank"] = bool(nodes) and "pagerank" in nodes[0][1]
+        return G, data["perf"]
 
     # TODO Rename this here and in `build_from_file`
-    def _finalize_graph(self, t_total, perf, arg2):
+    def _finalize_graph(self, t_total, perf, arg2, snapshot=False, pagerank_done=False):
         perf["total_s"] = round(time.perf_counter() - t_total, 4)
         arg2.graph["_perf"] = perf
-        
+        perf["finalize_scope"] = self.finalize_scope
+
+        t0 = self._stage_start("finalize")
+        if self.finalize_scope == "visible":
+            if snapshot:
+                self.last_snapshot = self.dump_snapshot(arg2, perf)
+            # Recorte primero: PageRank solo sobre el subárbol visible
+            arg2 = self._apply_max_nodes(arg2)
+            self._assign_pagerank(arg2)
+        else:
+            if not pagerank_done:
+                self._assign_pagerank(arg2)
+            if snapshot:
+                self.last_snapshot = self.dump_snapshot(arg2, perf)
+            arg2 = self._apply_max_nodes(arg2)
+        self._stage_end("finalize", t0, perf,
+                        nodes=arg2.number_of_nodes(), edges=arg2.number_of_edges())
+        budget = perf.get("budget")
+        if budget is not None and not perf.get("reclassified"):
+            elapsed = time.perf_counter() - t_total
+            rss     = _rss_mb() if self.memory_budget_mb else None
+            budget["elapsed_s"] = round(elapsed, 2)
+            budget["exceeded"]  = [dim for dim, hit in (
+                ("time",   bool(self.time_budget_s and elapsed > self.time_budget_s)),
+                ("memory", bool(self.memory_budget_mb and rss and rss > self.memory_budget_mb)),
+            ) if hit]
+        return arg2
+
+    @staticmethod
+    def _assign_pagerank(G: nx.DiGraph) -> None:
         # ── PageRank Calculation ───────────────────────────────────────────────
         # Calculate PageRank for all nodes in the graph
-        if arg2.number_of_nodes() > 0:
-            pagerank_scores = nx.pagerank(arg2, alpha=0.85, weight='weight')
+        if G.number_of_nodes() > 0:
+            pagerank_scores = nx.pagerank(G, alpha=0.85, weight='weight')
             
             # Assign PageRank values to nodes
             for node_id, pr_score in pagerank_scores.items():
-                arg2.nodes[node_id]['pagerank'] = pr_score
+                G.nodes[node_id]['pagerank'] = pr_score
             
             # Normalize PageRank values to 0-100 scale for easier frontend consumption
             if pagerank_scores:
@@ -1323,107 +2335,164 @@ class ScienceTreeBuilder:
                 if pr_range > 0:
                     for node_id, pr_score in pagerank_scores.items():
                         normalized_pr = ((pr_score - min_pr) / pr_range) * 100
-                        arg2.nodes[node_id]['pagerank_norm'] = normalized_pr
+                        G.nodes[node_id]['pagerank_norm'] = normalized_pr
                 else:
                     # All nodes have the same PageRank, assign equal normalized values
                     for node_id in pagerank_scores:
-                        arg2.nodes[node_id]['pagerank_norm'] = 50.0
-        
-        return self._apply_max_nodes(arg2)
+                        G.nodes[node_id]['pagerank_norm'] = 50.0
 
     # ── Ghost nodes ────────────────────────────────────────────────────────────
 
+    def _canonical_map(self, unique_raws: list, ext: str) -> dict:
+        """
+        {variante → canónico} para las referencias del corpus.
+
+        Sin ref_cache equivale a jw.build_duplicates(unique_raws). Con ref_cache:
+          1. Los strings ya vistos en builds anteriores toman su canónico
+             directamente de la caché.
+          2. JW corre solo sobre los strings nuevos + los canónicos conocidos
+             (para que una variante nueva pueda unirse a un clásico ya visto).
+          3. En cada clase fusionada se conserva el canónico de la caché si
+             existe (IDs estables entre builds); si no, el de JW. Si JW une
+             varios canónicos de la caché, toda la clase (strings conocidos
+             incluidos) pasa al menor y la caché se reescribe (remap).
+          4. Los strings nuevos se escriben en la caché con su canónico.
+        """
+        if self.ref_cache is None:
+            return self.jw.build_duplicates(unique_raws, fmt=ext)
+
+        known  = self.ref_cache.lookup(unique_raws, ext)
+        unseen = [s for s in unique_raws if s not in known]
+        if not unseen:
+            return {s: c for s, c in known.items() if s != c}
+
+        anchors = set(known.values())
+        jw_map  = self.jw.build_duplicates(unseen + list(anchors), fmt=ext)
+
+        classes: dict = defaultdict(list)
+        for s in set(unseen) | anchors:
+            classes[jw_map.get(s, s)].append(s)
+        resolved: dict = {}
+        remap: dict    = {}   # canónico de caché absorbido → canónico de la clase
+        for root, members in classes.items():
+            cached = sorted(m for m in members if m in anchors)
+            target = cached[0] if cached else root
+            for m in members:
+                resolved[m] = target
+            remap.update((c, target) for c in cached[1:])
+
+        self.ref_cache.store({s: resolved[s] for s in unseen}, ext)
+        if remap:
+            self.ref_cache.remap(remap, ext)
+
+        result = {}
+        for s, c in known.items():
+            c = remap.get(c, c)
+            if s != c:
+                result[s] = c
+        result.update((s, resolved[s]) for s in unseen if resolved[s] != s)
+        return result
+
     def _add_ghost_nodes(self, papers: list, ext: str) -> list:
-        extractor = ReferenceNodeExtractor()
+        return [*papers, *self._iter_ghost_nodes(papers, ext)]
 
-        corpus_first_author: dict = {}
-        for p in papers:
-            if p.get("authors") and len(p["authors"]) > 0:
-                fa_parts = p["authors"][0].split(",")[0].split() if p["authors"][0] else []
-                if fa_parts:  # Solo lo asigna si sobrevivió al split
-                    corpus_first_author[p["id"]] = fa_parts[0].lower()
+    @staticmethod
+    def _raw_refs(p: dict, ext: str) -> list:
+        if ext == ".txt":
+            raw = p.get("_refs_raw", [])
+        else:
+            # Para CSV y BIB: usar strings crudos (_refs_strings), nunca los IDs normalizados
+            raw = p.get("_refs_strings") or p.get("_refs_raw", [])
+        # Filtramos strings vacíos que nos genere Scopus:
+        return [r for r in raw if isinstance(r, str) and r.strip()]
 
-        all_ref_strings: list = []
-        paper_refs_map:  dict = {}
+    @staticmethod
+    def _ref_to_rid(ref_str: str, ext: str) -> str:
+        if ext == ".txt":
+            if m := re.search(r'DOI\s+(10\.\S+)', ref_str, re.IGNORECASE):
+                return m[1].rstrip(",. ").lower()
+            pts = [x.strip() for x in ref_str.split(",")]
+
+            # PROTECCIÓN WOS
+            a_parts = pts[0].split() if pts and pts[0] else []
+            a = a_parts[0].lower() if a_parts else "unk"
+
+            y = pts[1].strip()[:4] if len(pts) > 1 else "0000"
+            return f"{a}_{y}"
+        else:
+            if m := re.search(r'10\.\d{4,}/\S+', ref_str):
+                return m[0].rstrip(",. )").lower()
+            ym = re.search(r'\((\d{4})\)', ref_str)
+            y  = ym[1] if ym else "0000"
+
+            # PROTECCIÓN SCOPUS
+            first_comma_part = ref_str.split(",")[0].strip() if ref_str else ""
+            a_parts = first_comma_part.split()
+            a = a_parts[0].lower() if a_parts else "unk"
+
+            return f"{a}_{y}"
+
+    def _iter_ghost_nodes(self, papers: list, ext: str):
+        """
+        Generador de ghost nodes (referencias externas co-citadas).
+
+        Dos pases sobre las referencias de cada paper, sin listas intermedias:
+          1. strings únicos (entrada de JW) + ids/DOIs del corpus.
+          2. conteo de co-citación por rid, con un string representativo por
+             rid; (rid, primer apellido) se tokeniza una sola vez por string
+             canónico, no por ocurrencia.
+        Los registros ghost se construyen al consumir el generador.
+        """
+        extractor = ReferenceNodeExtractor()
+
+        unique_raws:   dict = {}
+        existing_ids:  set  = set()
+        existing_dois: set  = set()
         for p in papers:
-            if ext == ".txt":
-                raw = p.get("_refs_raw", [])
-            else:
-                # Para CSV y BIB: usar strings crudos (_refs_strings), nunca los IDs normalizados
-                raw = p.get("_refs_strings") or p.get("_refs_raw", [])
-            
-            # Filtramos strings vacíos que nos genere Scopus:
-            raw = [r for r in raw if r.strip()] 
-            
-            paper_refs_map[p["id"]] = raw
-            all_ref_strings.extend(raw)
+            existing_ids.add(p["id"])
+            if p.get("doi"):
+                existing_dois.add(p["doi"].lower())
+            if self.use_jaro_winkler:
+                unique_raws.update(dict.fromkeys(self._raw_refs(p, ext)))
 
         jw_map: dict = {}
-        if self.use_jaro_winkler and all_ref_strings:
-            # Filtrar solo strings válidos para evitar IndexError
-            valid_refs = [ref for ref in all_ref_strings if isinstance(ref, str) and ref.strip()]
-            if valid_refs:
-                unique_raws = list(set(valid_refs))
-                jw_map = self.jw.build_duplicates(unique_raws, fmt=ext)
-
-        def canonical(s: str) -> str:
-            return jw_map.get(s, s)
-
-        def ref_to_rid(ref_str: str) -> str:
-            if ext == ".txt":
-                if m := re.search(r'DOI\s+(10\.\S+)', ref_str, re.IGNORECASE):
-                    return m[1].rstrip(",. ").lower()
-                pts = [x.strip() for x in ref_str.split(",")]
-                
-                # PROTECCIÓN WOS
-                a_parts = pts[0].split() if pts and pts[0] else []
-                a = a_parts[0].lower() if a_parts else "unk"
-                
-                y = pts[1].strip()[:4] if len(pts) > 1 else "0000"
-                return f"{a}_{y}"
-            else:
-                if m := re.search(r'10\.\d{4,}/\S+', ref_str):
-                    return m[0].rstrip(",. )").lower()
-                ym = re.search(r'\((\d{4})\)', ref_str)
-                y  = ym[1] if ym else "0000"
-                
-                # PROTECCIÓN SCOPUS
-                first_comma_part = ref_str.split(",")[0].strip() if ref_str else ""
-                a_parts = first_comma_part.split()
-                a = a_parts[0].lower() if a_parts else "unk"
-                
-                return f"{a}_{y}"
+        if self.use_jaro_winkler and unique_raws:
+            jw_map = self._canonical_map(list(unique_raws), ext)
+        del unique_raws
 
+        tokens:    dict    = {}   # canónico → (rid, primer apellido)
         ref_count: Counter = Counter()
         ref_raw:   dict    = {}
         for p in papers:
-            paper_fa = corpus_first_author.get(p["id"], "")
-            seen:    set = set()
-            for ref_str in paper_refs_map.get(p["id"], []):
-                canon = canonical(ref_str)
-                rid   = ref_to_rid(canon)
+            paper_fa = ""
+            if p.get("authors") and p["authors"][0]:
+                fa_parts = p["authors"][0].split(",")[0].split()
+                paper_fa = fa_parts[0].lower() if fa_parts else ""
+            seen: set = set()
+            for ref_str in self._raw_refs(p, ext):
+                canon = jw_map.get(ref_str, ref_str)
+                tok   = tokens.get(canon)
+                if tok is None:
+                    rf_parts = canon.split(",")[0].split()
+                    tok = tokens[canon] = (
+                        self._ref_to_rid(canon, ext),
+                        rf_parts[0].lower() if rf_parts else "",
+                    )
+                rid, rf = tok
                 if rid in seen: continue
                 seen.add(rid)
-                if self.exclude_self_citations and paper_fa:
-                    pts = [x.strip() for x in canon.split(",")]
-                    rf_parts = pts[0].split() if pts else []
-                    rf  = rf_parts[0].lower() if rf_parts else ""
-                    if rf and rf == paper_fa: continue
+                if self.exclude_self_citations and paper_fa and rf and rf == paper_fa:
+                    continue
                 ref_count[rid] += 1
                 ref_raw[rid]    = canon
+        del tokens, jw_map
 
-        existing_ids  = {p["id"] for p in papers}
-        existing_dois = {p["doi"].lower() for p in papers if p.get("doi")}
-
-        ghost_map: dict = {}
         for rid, count in ref_count.items():
             if count < self.min_cocitations or rid in existing_ids: continue
             raw   = ref_raw[rid]
             ghost = extractor.from_wos_cr(raw) if ext == ".txt" else extractor.from_scopus_csv(raw)
             if ghost.get("doi") and ghost["doi"] in existing_dois: continue
-            ghost_map[rid] = ghost
-
-        return papers + list(ghost_map.values())
+            yield ghost
 
     # ── Construcción del grafo ─────────────────────────────────────────────────
 
@@ -1468,11 +2537,15 @@ class ScienceTreeBuilder:
                 cid = _generate_canonical_id(p["authors"][0], p["year"], p["title"])
                 idx.setdefault(cid, pid)
 
+        # Componentes débiles mantenidas durante la inserción (use_lcc)
+        wcc = self._wcc = _WccTracker(G) if self.use_lcc else None
         for p in papers:
             for ref in p.get("references", []):
                 target = idx.get(ref.lower())
                 if target and target != p["id"]:
                     G.add_edge(p["id"], target)
+                    if wcc is not None:
+                        wcc.add_edge(p["id"], target)
         return G
 
     # ── Recorte max_nodes ─────────────────────────────────────────────────────
@@ -1484,16 +2557,15 @@ class ScienceTreeBuilder:
 
         dead_leaf e isolated se eliminan siempre (no forman parte del árbol
         visible). branch se trata igual que trunk/leaf para el recorte.
+        Modifica G in-place (el grafo pertenece al pipeline de build_from_file).
         """
         if self.max_nodes is None and G.number_of_nodes() == 0:
             return G
 
         # Eliminar grupos ocultos del árbol de visualización:
         # dead_leaf/isolated (estructura) + minor_root/minor_leaf (élite)
-        _HIDDEN = ("dead_leaf", "isolated", "minor_root", "minor_leaf")
         if non_tree := [n for n, d in G.nodes(data=True)
-                        if d.get("group") in _HIDDEN]:
-            G = G.copy()
+                        if d.get("group") in _HIDDEN_GROUPS]:
             G.remove_nodes_from(non_tree)
 
         if self.max_nodes is None or G.number_of_nodes() <= self.max_nodes:
@@ -1506,13 +2578,11 @@ class ScienceTreeBuilder:
             grp = d.get("group", "leaf")
             groups.setdefault(grp, []).append((n, d.get("_sap", 0)))
         to_remove   = []
-        total_keep  = 0
         group_items = []
         for nodes_list in groups.values():
-            nodes_sorted = sorted(nodes_list, key=lambda x: x[1], reverse=True)
-            proportion   = len(nodes_sorted) / total
+            proportion   = len(nodes_list) / total
             quota        = max(1, round(self.max_nodes * proportion))
-            group_items.append((nodes_sorted, quota))
+            group_items.append((nodes_list, quota))
 
         # Ajuste final: si la suma de cuotas supera max_nodes, recortar al grupo
         # con más nodos descartados (los de menor SAP global)
@@ -1527,9 +2597,9 @@ class ScienceTreeBuilder:
                 group_items_sorted[idx] = (group_items_sorted[idx][0], max(1, q - 1))
             group_items = group_items_sorted
 
-        for nodes_sorted, keep_n in group_items:
-            to_remove.extend(n for n, _ in nodes_sorted[keep_n:])
-        G = G.copy()
+        for nodes_list, keep_n in group_items:
+            keep = {n for n, _ in _top_k(nodes_list, keep_n, key=lambda x: x[1])}
+            to_remove.extend(n for n, _ in nodes_list if n not in keep)
         G.remove_nodes_from(to_remove)
         return G
 
@@ -1551,7 +2621,9 @@ if __name__ == "__main__":
     import sys, json
 
     if len(sys.argv) < 2:
-        print("Uso: python science_tree_builder.py <archivo> [min_cocitations] [--slow-sap]")
+        print("Uso: python science_tree_builder.py <archivo> [min_cocitations] [--slow-sap] "
+              "[--dedup=bucket|minhash] [--dedup-report] [--visible-only] "
+              "[--time-budget=S] [--memory-budget=MB]")
         sys.exit(1)
 
     min_coc    = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else None
@@ -1560,7 +2632,12 @@ if __name__ == "__main__":
     trunk_lim  = 20
     root_lim   = 20
     leaf_lim   = 25
+    dedup      = True
+    time_bud   = None
+    mem_bud    = None
     for arg in sys.argv[1:]:
+        if arg.startswith("--dedup="):
+            dedup = arg.split("=")[1]
         if arg.startswith("--window="):
             try: leaf_win  = int(arg.split("=")[1])
             except ValueError: pass
@@ -1573,15 +2650,36 @@ if __name__ == "__main__":
         if arg.startswith("--leaf-limit="):
             try: leaf_lim  = int(arg.split("=")[1])
             except ValueError: pass
+        if arg.startswith("--time-budget="):
+            try: time_bud  = float(arg.split("=")[1])
+            except ValueError: pass
+        if arg.startswith("--memory-budget="):
+            try: mem_bud   = float(arg.split("=")[1])
+            except ValueError: pass
+
+    if "--dedup-report" in sys.argv:
+        # Reporte calidad/velocidad MinHash/LSH vs JW por bloques sobre las refs del archivo
+        _ext = os.path.splitext(sys.argv[1].lower())[1]
+        with open(sys.argv[1], "rb") as _f:
+            _papers = ScienceTreeBuilder.PARSERS[_ext]().parse(_f)
+        _refs = [r for p in _papers
+                 for r in (p.get("_refs_raw") if _ext == ".txt" else p.get("_refs_strings")) or []
+                 if r.strip()]
+        print(json.dumps(compare_dedup_engines(_refs, fmt=_ext), indent=2))
+        sys.exit(0)
 
     try:
         G = ScienceTreeBuilder(
             min_cocitations=min_coc,
+            use_jaro_winkler=dedup,
             fast_sap=fast_sap,
             leaf_window=leaf_win,
             top_trunk_limit=trunk_lim,
             top_root_limit=root_lim,
             top_leaf_limit=leaf_lim,
+            finalize_scope="visible" if "--visible-only" in sys.argv else "full",
+            time_budget_s=time_bud,
+            memory_budget_mb=mem_bud,
         ).build_from_file(sys.argv[1])
 
         perf = G.graph.get("_perf", {})
@@ -1612,7 +2710,10 @@ if __name__ == "__main__":
                 "build_graph_s":  perf.get("build_s"),
                 "lcc_s":          perf.get("lcc_s"),
                 "classify_sap_s": perf.get("classify_s"),
+                "finalize_s":     perf.get("finalize_s"),
                 "sap_mode":       perf.get("sap_mode"),
+                "budget":         perf.get("budget"),
+                "degradations":   perf.get("degradations"),
             },
             "corpus": {
                 "papers_input":    perf.get("corpus_papers"),
@@ -1668,6 +2769,11 @@ def _run_tests():
         test_bug3_ris_references_not_empty,
         test_bug5_max_nodes_not_exceeded,
         test_alg2_metadata_total_value_normalized,
+        test_jw_blocking_multikey_recall,
+        test_ref_cache_merges_cached_classes,
+        test_prune_min_degree_matches_k_core,
+        test_wcc_tracker_matches_networkx,
+        test_budget_degradation_ladder,
         test_full_pipeline_csv,
     ]
     passed, failed = 0, 0
@@ -1737,6 +2843,82 @@ def test_alg2_metadata_total_value_normalized():
             f"total_value fuera de [0,1]: {r['total_value']} para {r['id']}"
 
 
+def test_jw_blocking_multikey_recall():
+    """Un typo en el apellido no debe impedir la fusión (clave año+vol+pág)."""
+    jw = JaroWinklerDeduplicator()
+    a  = "SMITHSON A, 2001, J SCI, V12, P345"
+    b  = "SMIHTSON A, 2001, J SCI, V12, P345"
+    assert JaroWinklerDeduplicator._key_wos(a) != JaroWinklerDeduplicator._key_wos(b)
+    dup = jw.build_duplicates([a, b], fmt=".txt")
+    assert dup == {a: b}, f"Fusión esperada no encontrada: {dup}"
+    assert jw.last_stats["comparisons"] == 1, jw.last_stats
+
+
+def test_ref_cache_merges_cached_classes():
+    """Si JW une dos canónicos de la caché, toda la clase comparte uno solo."""
+    class DictCache:
+        def __init__(self, data):
+            self.data = dict(data)
+        def lookup(self, strings, fmt):
+            return {s: self.data[s] for s in strings if s in self.data}
+        def store(self, mapping, fmt):
+            for s, c in mapping.items():
+                self.data.setdefault(s, c)
+        def remap(self, mapping, fmt):
+            self.data = {s: mapping.get(c, c) for s, c in self.data.items()}
+
+    a  = "SMITHSON A, 2001, J SCI, V12, P345"
+    a2 = "SMITHSON A, 2001, J SCI., V12, P345"
+    b  = "SMIHTSON A, 2001, J SCI, V12, P345"
+    c  = "SMITHSON A, 2001, J SCI, V12, P345."
+    cache = DictCache({a: a, a2: a, b: b})
+    builder = ScienceTreeBuilder(ref_cache=cache)
+    dup = builder._canonical_map([a, a2, b, c], ".txt")
+    assert len({dup.get(s, s) for s in (a, a2, b, c)}) == 1, dup
+    assert len(set(cache.data.values())) == 1, cache.data
+
+
+def test_prune_min_degree_matches_k_core():
+    """El peeling en bloque debe coincidir con nx.k_core en grafos aleatorios."""
+    for seed in range(20):
+        G = nx.gnp_random_graph(200, 0.02 + seed * 0.002, seed=seed, directed=True)
+        for k in (1, 2, 3, 5):
+            expected = set(nx.k_core(G, k))
+            got      = set(_prune_min_degree(G.copy(), k))
+            assert got == expected, f"seed={seed} k={k}: {len(got)} != {len(expected)}"
+
+
+def test_wcc_tracker_matches_networkx():
+    """Componentes incrementales = weakly_connected_components (con top-K)."""
+    for seed in range(10):
+        G = nx.gnp_random_graph(300, 0.004, seed=seed, directed=True)
+        w = _WccTracker(G)
+        for u, v in G.edges():
+            w.add_edge(u, v)
+        comps = sorted(nx.weakly_connected_components(G), key=len, reverse=True)
+        for k in (1, 3):
+            drop, sizes = w.split(G, k)
+            kept = set(G) - set(drop)
+            assert sizes.tolist() == [len(c) for c in comps], f"seed={seed}"
+            assert len(kept) == sum(len(c) for c in comps[:k]), f"seed={seed} k={k}"
+            assert any(kept >= c for c in comps[:1]), f"seed={seed}: LCC descartado"
+
+
+def test_budget_degradation_ladder():
+    """Presupuesto imposible → escalera completa en orden; sin presupuesto → nada."""
+    import time as _t
+    b = ScienceTreeBuilder(min_cocitations=2, fast_sap=False, time_budget_s=1)
+    perf = {"parse_s": 10.0, "budget": {}, "degradations": []}
+    b._check_budget("parse", tuple(_BUDGET_COST), _DEGRADATIONS, _t.perf_counter(), perf)
+    assert [d["action"] for d in perf["degradations"]] == list(_DEGRADATIONS), perf
+    assert (b.fast_sap, b.min_cocitations, b.use_jaro_winkler, b.include_ghost_nodes) == (True, 4, False, False)
+    b._reset_degradations()
+    assert (b.fast_sap, b.use_jaro_winkler, b.include_ghost_nodes) == (False, True, True)
+    perf = {"parse_s": 0.001, "budget": {}, "degradations": []}
+    b._check_budget("parse", tuple(_BUDGET_COST), _DEGRADATIONS, _t.perf_counter(), perf)
+    assert perf["degradations"] == [], perf
+
+
 def test_full_pipeline_csv():
     """Pipeline completo debe terminar sin excepciones y producir un grafo válido."""
     G = ScienceTreeBuilder().build_from_file("scopus.csv")
@@ -1,12 +1,87 @@
 from rest_framework import serializers
-from .models import Tree
+from .models import Tree, TreeSnapshot
 from bibliography.serializers import BibliographyListSerializer
-import networkx as nx
 from datetime import datetime
+from django.conf import settings
 from rest_framework.exceptions import ValidationError
 from .science_tree_builder import ScienceTreeBuilder
+from .reference_cache import DBReferenceCache
+from .metrics import StageMetricsHook
+from .renderers import RawJSON
+import json
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+
+# Parámetros del builder usados al generar árboles desde la API
+_BUILDER_PARAMS = dict(
+    # Parámetros que mantienen la precisión del algoritmo
+    # Solo optimizamos lo que no afecta la calidad del árbol
+    min_degree=1,
+    min_cocitations=2,
+    include_ghost_nodes=True,  # ✅ Mantener ghost nodes para completitud
+    exclude_self_citations=True,
+    use_jaro_winkler=True,   # ✅ Mantener deduplicación para evitar duplicados
+    fast_sap=False,           # ✅ O(N) - rápido sin perder precisión
+    use_lcc=True,
+)
+
+# Parámetros re-ajustables tras generar el árbol (tree_reclassify): solo
+# afectan a clasificación y recorte, no a parseo / JW / grafo.
+_RETUNABLE_DEFAULTS = dict(
+    leaf_window=5,
+    top_trunk_limit=30,
+    top_root_limit=20,
+    top_leaf_limit=60,
+    max_nodes=90,            # Mantener nodos completos
+)
+
+
+def log_build_perf(event, graph, **context):
+    """
+    Emite G.graph["_perf"] como una línea de log JSON (una por build) y lo
+    devuelve para persistirlo en Tree.build_perf.
+    """
+    perf = graph.graph.get('_perf', {})
+    logger.info(json.dumps({'event': f'tree_{event}', **context, 'perf': perf}, default=str))
+    return perf
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ESQUEMA DE ENLACES DE arbol_json
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# v2.0: "links": [{"source": "<id>", "target": "<id>"}, ...] repitiendo los ids
+#       completos (DOIs / ids canónicos) en cada enlace.
+# v3.0: cada nodo lleva "index" (su posición en "nodes") y
+#       "links": {"source": [i, ...], "target": [j, ...]} como dos arrays
+#       paralelos de índices. Solo se guardan enlaces entre nodos presentes.
+# Las filas v2.0 se reescriben a v3.0 en la migración trees/0006_arbol_json_v3.
+
+ARBOL_JSON_VERSION = "3.0"
+LINK_ENCODING = "index_arrays"
+
+
+def encode_links(nodes, pairs):
+    """
+    Asigna nodes[i]['index'] = i y codifica los pares (source_id, target_id)
+    como arrays paralelos de índices. Los enlaces hacia nodos filtrados
+    (sin relevancia o sin etiqueta) no tienen índice y se descartan.
+    """
+    index = {}
+    for i, node in enumerate(nodes):
+        node['index'] = i
+        index[node['id']] = i
+    sources, targets = [], []
+    for u, v in pairs:
+        si, ti = index.get(str(u)), index.get(str(v))
+        if si is not None and ti is not None:
+            sources.append(si)
+            targets.append(ti)
+    return {'source': sources, 'target': targets}
+
 
 class TreeCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -42,7 +117,14 @@ class TreeCreateSerializer(serializers.ModelSerializer):
         arbol_json = self.generate_tree_from_seed(validated_data['seed'], bibliography_file)
 
         # Crear la instancia del árbol y asignar el arbol_json
-        return Tree.objects.create(**validated_data, arbol_json=arbol_json)
+        tree = Tree.objects.create(
+            **validated_data,
+            arbol_json=arbol_json,
+            build_perf=getattr(self, '_perf', {}),
+        )
+        if snapshot := getattr(self, '_snapshot', None):
+            TreeSnapshot.objects.create(tree=tree, data=snapshot)
+        return tree
 
     def generate_tree_from_seed(self, seed, archivo):
         """
@@ -54,9 +136,14 @@ class TreeCreateSerializer(serializers.ModelSerializer):
         4) Si no hay nodos válidos, lanza error de validación.
         5) Calcula estadísticas y compone el JSON final optimizado.
         """
-        from rest_framework.exceptions import ValidationError
-
         graph = self._build_graph_from_file(archivo)
+        return self.graph_to_arbol_json(seed, graph, _RETUNABLE_DEFAULTS)
+
+    def graph_to_arbol_json(self, seed, graph, parameters):
+        """
+        Pasos 3-5 de generate_tree_from_seed sobre un grafo ya clasificado
+        (compartido con la reclasificación).
+        """
         nodes_with_attributes, stats = self._extract_nodes_with_stats(graph)
 
         if not nodes_with_attributes:
@@ -65,26 +152,27 @@ class TreeCreateSerializer(serializers.ModelSerializer):
             )
 
         links = self._extract_links(graph)
-        return self._compose_transformed_data(seed, nodes_with_attributes, links, stats)
+        return self._compose_transformed_data(
+            seed, nodes_with_attributes, links, stats, parameters=parameters,
+            degradations=graph.graph.get('_perf', {}).get('degradations'),
+        )
 
     def _build_graph_from_file(self, archivo):
         try:
-            # Parámetros que mantienen la precisión del algoritmo
-            # Solo optimizamos lo que no afecta la calidad del árbol
-            return ScienceTreeBuilder(
-                min_degree=1,
-                min_cocitations=2,
-                include_ghost_nodes=True,  # ✅ Mantener ghost nodes para completitud
-                exclude_self_citations=True,
-                use_jaro_winkler=True,   # ✅ Mantener deduplicación para evitar duplicados
-                fast_sap=False,           # ✅ O(N) - rápido sin perder precisión
-                use_lcc=True,
-                leaf_window=5,
-                top_trunk_limit=30,
-                top_root_limit=20,
-                top_leaf_limit=60,
-                max_nodes=90,            # Mantener nodos completos
-            ).build_from_file(archivo)
+            builder = ScienceTreeBuilder(
+                **_BUILDER_PARAMS,
+                **_RETUNABLE_DEFAULTS,
+                ref_cache=DBReferenceCache(),  # Canónicos JW reutilizados entre builds
+                keep_snapshot=True,            # Grafo post-LCC para tree_reclassify
+                hooks=[StageMetricsHook(os.path.splitext(archivo.name or '')[1].lower())],
+                # Corpus grandes: degradación en vez de rechazo (metadata.degradations)
+                time_budget_s=settings.TREE_BUILD_BUDGET.get('TIME_S'),
+                memory_budget_mb=settings.TREE_BUILD_BUDGET.get('MEMORY_MB'),
+            )
+            graph = builder.build_from_file(archivo)
+            self._snapshot = builder.last_snapshot
+            self._perf = log_build_perf('build', graph)
+            return graph
         except ValueError as e:
             raise ValidationError(str(e)) from e
         except Exception as exc:
@@ -117,175 +205,127 @@ class TreeCreateSerializer(serializers.ModelSerializer):
                 f"Formato de archivo no soportado. Use: {', '.join(allowed_extensions)}"
             )
         
-        # Validar número de papers (solo para CSV)
-        if file_extension == '.csv':
-            try:
-                # Leer solo las primeras líneas para contar papers sin cargar todo
-                archivo.seek(0)
-                content = archivo.read(1024 * 1024)  # Leer primer 1MB
-                lines = content.decode('utf-8', errors='ignore').split('\n')
-                
-                # Estimar número de papers (líneas - header)
-                estimated_papers = max(0, len(lines) - 1)
-                
-                # Si hay más de 1000 líneas en el primer MB, estimar proporcionalmente
-                if estimated_papers > 1000:
-                    # Estimar total basado en la proporción
-                    lines_per_mb = len(lines)
-                    estimated_total = int(lines_per_mb * (archivo.size / (1024 * 1024)))
-                    estimated_papers = max(estimated_papers, estimated_total)
-                
-                max_papers = 5000
-                if estimated_papers > max_papers:
-                    raise serializers.ValidationError(
-                        f"El archivo contiene demasiados papers. Máximo permitido: {max_papers}. "
-                        f"Estimado en archivo: {estimated_papers}"
-                    )
-                    
-            except Exception:
-                # Si hay error en la lectura, continuar con validación básica
-                pass
-        
+        # Sin tope de papers: los corpus grandes se degradan dentro de los
+        # presupuestos de settings.TREE_BUILD_BUDGET (ver ScienceTreeBuilder)
+
         archivo.seek(0)  # Resetear puntero para uso posterior
         return attrs
 
+    # Campos fijos de cada nodo: el resto de atributos escalares del grafo se
+    # copian tal cual (pagerank, title, source, _sap_norm...)
+    _NODE_FIELDS = frozenset({
+        'id', 'label', 'root', 'trunk', 'leaf', 'total_value', 'group', 'type_label',
+        '_sap', 'url', 'doi', 'pmid', 'arxiv_id', 'year', 'authors', 'times_cited', 'is_ghost',
+    })
+    _SCALAR_TYPES = (int, float, str, bool, type(None))
+
     def _extract_nodes_with_stats(self, graph):
         """
-        Recorre los nodos del grafo, filtra ruido, clasifica y acumula estadísticas.
+        Una sola pasada sobre los nodos del grafo: filtra ruido, construye el
+        dict de salida de cada nodo y acumula las estadísticas (incluidos los
+        ghost nodes) sin estructuras intermedias.
         """
         nodes_with_attributes = []
-        stats = {
-            'roots': 0,
-            'trunks': 0,
-            'leaves': 0,
-            'total_value': 0,
-            'sum_sap': 0,
-            'max_sap': 0,
-            'min_sap': float('inf'),
-        }
+        append = nodes_with_attributes.append
+        roots = trunks = leaves = ghosts = 0
+        total_value = sum_sap = max_sap = 0
+        min_sap = float('inf')
+        fixed, scalar = self._NODE_FIELDS, self._SCALAR_TYPES
+        type_labels = {'root': self._get_type_label('root'), 'trunk': self._get_type_label('trunk'),
+                       'leaf': self._get_type_label('leaf')}
 
         for node_id, node_data in graph.nodes(data=True):
-            node_dict, classification = self._build_node_dict(node_id, node_data)
-            if node_dict is None:
-                # Nodo descartado por falta de relevancia (total_value == 0)
+            get = node_data.get
+            root_val  = float(get('root', 0))
+            trunk_val = float(get('trunk', 0))
+            leaf_val  = float(get('leaf', 0))
+            total_val = root_val + trunk_val + leaf_val
+            # FILTRADO CRÍTICO: eliminar nodos sin relevancia
+            if total_val == 0:
                 continue
 
             # FILTRO ADICIONAL: Eliminar nodos con valores undefined/empty críticos
-            label = node_dict.get('label', '')
-            title = node_dict.get('title', '')
-            node_id = node_dict.get('id', '')
-            
-            # Verificar valores vacíos, nulos o que contengan "undefined"
-            if (not node_id or not label or not title or 
-                node_id == 'undefined' or label == 'undefined' or title == 'undefined' or
-                'undefined' in label.lower() or 'undefined' in title.lower() or
-                label == '' or title == ''):
+            node_id = str(node_id)
+            label   = get('label', node_id)
+            title   = get('title', '')
+            if (not node_id or not label or not title or node_id == 'undefined'
+                    or 'undefined' in label.lower() or 'undefined' in title.lower()):
                 continue
 
-            dominant_group, total_val, sap_val = classification
+            # Clasificación dominante: ya viene calculada por ScienceTreeClassifier
+            dominant_group = get('group', 'leaf')
+            sap_val        = float(get('_sap', 0))
+            is_ghost       = get('_is_ghost', get('is_ghost', False))
+            times_cited    = get('times_cited')
+
+            node_dict = {
+                'id': node_id,
+                'label': label,
+                'root': root_val,
+                'trunk': trunk_val,
+                'leaf': leaf_val,
+                'total_value': total_val,
+                'group': dominant_group,
+                'type_label': type_labels.get(dominant_group, 'Desconocido'),
+                '_sap': sap_val,
+                'url': get('url'),
+                'doi': get('doi'),
+                'pmid': get('pmid'),
+                'arxiv_id': get('arxiv_id'),
+                'year': get('year'),
+                'authors': get('authors'),
+                'times_cited': int(times_cited) if times_cited else 0,
+                # Ghost node flag - importante para verificar precisión del algoritmo
+                'is_ghost': is_ghost,
+            }
+            # Agregar atributos adicionales simples que no sean estándar
+            for key, value in node_data.items():
+                if key not in fixed and isinstance(value, scalar):
+                    node_dict[key] = value
+            append(node_dict)
 
-            # Actualizar contadores por grupo
             if dominant_group == 'root':
-                stats['roots'] += 1
+                roots += 1
             elif dominant_group == 'trunk':
-                stats['trunks'] += 1
+                trunks += 1
             else:
-                stats['leaves'] += 1
-
-            # Actualizar estadísticas globales
-            stats['total_value'] += total_val
-            stats['sum_sap'] += sap_val
-            stats['max_sap'] = max(stats['max_sap'], sap_val)
-            if sap_val > 0:
-                stats['min_sap'] = min(stats['min_sap'], sap_val)
-
-            nodes_with_attributes.append(node_dict)
-
-        return nodes_with_attributes, stats
-
-    def _build_node_dict(self, node_id, node_data):
-        """
-        Construye el diccionario de un nodo, determinando su grupo dominante
-        y devolviendo también los valores relevantes para estadísticas.
+                leaves += 1
+            ghosts      += bool(is_ghost)
+            total_value += total_val
+            sum_sap     += sap_val
+            if sap_val > max_sap:
+                max_sap = sap_val
+            if 0 < sap_val < min_sap:
+                min_sap = sap_val
 
-        Retorna:
-        - (node_dict, (dominant_group, total_val, sap_val)) si el nodo es válido.
-        - (None, None) si el nodo se descarta por total_val == 0.
-        """
-        root_val = float(node_data.get('root', 0))
-        trunk_val = float(node_data.get('trunk', 0))
-        leaf_val = float(node_data.get('leaf', 0))
-        total_val = root_val + trunk_val + leaf_val
-        sap_val = float(node_data.get('_sap', 0))
-
-        # FILTRADO CRÍTICO: eliminar nodos sin relevancia
-        if total_val == 0:
-            return None, None
-
-        # Clasificación dominante: ya viene calculada por ScienceTreeClassifier
-        dominant_group = node_data.get('group', 'leaf')
-
-        node_dict = {
-            # Identificadores
-            'id': str(node_id),
-            'label': node_data.get('label', str(node_id)),
-
-            # Valores de clasificación
-            'root': root_val,
-            'trunk': trunk_val,
-            'leaf': leaf_val,
-            'total_value': total_val,
-
-            # PRE-CALCULADOS
-            'group': dominant_group,
-            'type_label': self._get_type_label(dominant_group),
-
-            # Métricas importantes
-            '_sap': sap_val,
-
-            # Enlaces externos
-            'url': node_data.get('url'),
-            'doi': node_data.get('doi'),
-            'pmid': node_data.get('pmid'),
-            'arxiv_id': node_data.get('arxiv_id'),
-
-            # Metadatos opcionales
-            'year': node_data.get('year'),
-            'authors': node_data.get('authors'),
-            'times_cited': int(node_data.get('times_cited', 0)) if node_data.get('times_cited') else 0,
-            
-            # Ghost node flag - importante para verificar precisión del algoritmo
-            'is_ghost': node_data.get('_is_ghost', False),
+        stats = {
+            'roots': roots,
+            'trunks': trunks,
+            'leaves': leaves,
+            'total_value': total_value,
+            'sum_sap': sum_sap,
+            'max_sap': max_sap,
+            'min_sap': min_sap,
+            'ghost_nodes': ghosts,
         }
-
-        # Agregar atributos adicionales simples que no sean estándar
-        for key, value in node_data.items():
-            if key not in node_dict and isinstance(value, (int, float, str, bool, type(None))):
-                node_dict[key] = value
-
-        # Asegurar que el flag is_ghost esté presente (copia defensiva)
-        if '_is_ghost' in node_data:
-            node_dict['is_ghost'] = node_data['_is_ghost']
-        elif 'is_ghost' in node_data:
-            node_dict['is_ghost'] = node_data['is_ghost']
-        else:
-            node_dict['is_ghost'] = False
-
-        return node_dict, (dominant_group, total_val, sap_val)
+        return nodes_with_attributes, stats
 
     @staticmethod
     def _extract_links(graph):
-        raw_data = nx.node_link_data(graph)
-        # nx >= 3.0 usa "edges"; nx 2.x usaba "links"
-        return raw_data.get("edges", raw_data.get("links", []))
+        # Directo desde las aristas: nx.node_link_data copiaba además todos
+        # los nodos solo para descartarlos. Pares (source, target) de ids;
+        # _compose_transformed_data los codifica por índice de nodo.
+        return list(graph.edges())
 
     @staticmethod
-    def _compose_transformed_data(seed, nodes_with_attributes, links, stats):
+    def _compose_transformed_data(seed, nodes_with_attributes, links, stats, parameters=None,
+                                  degradations=None):
         """
         Compone el diccionario final arbol_json con nodos, enlaces, estadísticas y metadatos.
         """
         # Ordenar por SAP descendente (más relevantes primero)
         nodes_with_attributes.sort(key=lambda x: x.get('_sap', 0), reverse=True)
+        links = encode_links(nodes_with_attributes, links)
 
         # Completar estadísticas finales
         stats['total'] = len(nodes_with_attributes)
@@ -302,20 +342,28 @@ class TreeCreateSerializer(serializers.ModelSerializer):
             "min_sap": stats['min_sap'],
         }
 
-        # Contar ghost nodes para estadísticas
-        ghost_count = sum(bool(n.get('is_ghost', False))
-                      for n in nodes_with_attributes)
+        # Contar ghost nodes para estadísticas (ya contados en la pasada de nodos)
+        ghost_count = stats.get('ghost_nodes')
+        if ghost_count is None:
+            ghost_count = sum(bool(n.get('is_ghost', False))
+                          for n in nodes_with_attributes)
         statistics['ghost_nodes'] = ghost_count
         statistics['corpus_nodes'] = stats['total'] - ghost_count
 
         metadata = {
-            "algorithm_version": "2.0",
+            "algorithm_version": ARBOL_JSON_VERSION,
+            "link_encoding": LINK_ENCODING,
             "seed": seed,
             "total_nodes": len(nodes_with_attributes),
-            "total_links": len(links),
+            "total_links": len(links["source"]),
             "generated_at": datetime.now().isoformat(),
             "optimization": "nodes_pre_filtered_and_classified",
         }
+        if parameters is not None:
+            metadata["parameters"] = dict(parameters)
+        if degradations is not None:
+            # Ajustes aplicados por los presupuestos de tiempo/memoria del build
+            metadata["degradations"] = list(degradations)
 
         return {
             "nodes": nodes_with_attributes,
@@ -325,13 +373,57 @@ class TreeCreateSerializer(serializers.ModelSerializer):
         }
 
 
+class TreeReclassifySerializer(serializers.Serializer):
+    """
+    Parámetros de re-ajuste de un árbol existente. Los omitidos conservan el
+    valor con el que se generó (metadata.parameters) o el defecto.
+    """
+    top_root_limit = serializers.IntegerField(min_value=1, max_value=500, required=False)
+    top_trunk_limit = serializers.IntegerField(min_value=1, max_value=500, required=False)
+    top_leaf_limit = serializers.IntegerField(min_value=1, max_value=500, required=False)
+    leaf_window = serializers.IntegerField(min_value=0, max_value=100, required=False)
+    max_nodes = serializers.IntegerField(min_value=10, max_value=2000, required=False, allow_null=True)
+
+    def reclassify(self, tree, snapshot):
+        """
+        Re-ejecuta clasificación + PageRank + recorte sobre el snapshot del
+        árbol y devuelve el nuevo arbol_json (no guarda).
+        """
+        previous = (tree.arbol_json or {}).get('metadata', {}).get('parameters', {})
+        parameters = {
+            k: self.validated_data.get(k, previous.get(k, default))
+            for k, default in _RETUNABLE_DEFAULTS.items()
+        }
+        graph = ScienceTreeBuilder(
+            **_BUILDER_PARAMS, **parameters, hooks=[StageMetricsHook('snapshot')]
+        ).reclassify(snapshot)
+        self.perf = log_build_perf('reclassify', graph, tree_id=tree.pk)
+        return TreeCreateSerializer().graph_to_arbol_json(tree.seed, graph, parameters)
+
+
 class TreeSerializer(serializers.ModelSerializer):
     bibliography = BibliographyListSerializer(read_only=True)
     
     class Meta:
         model = Tree
-        fields = ('id', 'arbol_json', 'fecha_generado', 'bibliography', 'seed', 'title')
-        read_only_fields = ('id', 'arbol_json', 'fecha_generado')
+        fields = ('id', 'arbol_json', 'fecha_generado', 'bibliography', 'seed', 'title', 'build_perf')
+        read_only_fields = ('id', 'arbol_json', 'fecha_generado', 'build_perf')
+
+
+class TreeDetailSerializer(TreeSerializer):
+    """
+    TreeSerializer para tree_detail: si la instancia trae arbol_json_text
+    (arbol_json::text anotado en la consulta) lo devuelve como RawJSON, sin
+    decodificar el JSONB. Requiere TreeJSONRenderer. Con context['arbol_json']
+    (vista parcial) devuelve ese dict.
+    """
+    arbol_json = serializers.SerializerMethodField()
+
+    def get_arbol_json(self, tree):
+        if (partial := self.context.get('arbol_json')) is not None:
+            return partial
+        raw = getattr(tree, 'arbol_json_text', None)
+        return RawJSON(raw) if raw is not None else tree.arbol_json
 
 
 class TreeListSerializer(serializers.ModelSerializer):
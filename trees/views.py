@@ -1,35 +1,71 @@
 from rest_framework import status, pagination
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.http import HttpResponse, Http404
-from django.db.models import Q
+from django.db.models import Q, TextField
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import Cast
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 import networkx as nx
+import base64
 import json
 import io
+import os
 import textwrap
-from .models import Tree, Bibliography
-from .serializers import TreeCreateSerializer, TreeSerializer, TreeListSerializer
+from .models import Tree, TreeSnapshot, Bibliography
+from .serializers import (
+    TreeCreateSerializer, TreeSerializer, TreeDetailSerializer, TreeListSerializer,
+    TreeReclassifySerializer,
+)
+from .renderers import TreeJSONRenderer
+from . import http_cache
+from .profiling import PROFILERS, run_profiled
+from .metrics import TREE_BUILDS, BUILD_SECONDS, BUILDS_IN_PROGRESS, EXPORT_SECONDS
+from tree_of_science.metrics import size_bucket
 
 # ─── CAMPOS LIGEROS para listados (excluye arbol_json que puede pesar MB) ──────
 _LIST_FIELDS = ('id', 'title', 'seed', 'fecha_generado', 'bibliography_id')
 
+# ─── Vista parcial de tree_detail ─────────────────────────────────────────────
+_DETAIL_PARAMS   = ('fields', 'nodes_only', 'links_only', 'include', 'cursor', 'limit')
+_DETAIL_SECTIONS = ('statistics', 'metadata')
+_NODES_PAGE_SIZE = 100
+_NODES_PAGE_MAX  = 1000
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([TreeJSONRenderer])
 def tree_generate(request):
     """
-    Generar un nuevo árbol de la ciencia
+    Generar un nuevo árbol de la ciencia.
+
+    Administradores: ?profile=cprofile|pyinstrument ejecuta la generación bajo
+    el perfilador y añade el informe en la respuesta ("profile").
     """
     serializer = TreeCreateSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        tree = serializer.save()
-        return Response(
-            TreeSerializer(tree, context={'request': request}).data,
-            status=status.HTTP_201_CREATED,
-        )
+        archivo = serializer.validated_data['bibliography'].archivo
+        fmt = os.path.splitext(archivo.name)[1].lower()
+        profile_mode = request.query_params.get('profile')
+        try:
+            with BUILDS_IN_PROGRESS.track_inprogress(), \
+                    BUILD_SECONDS.labels(format=fmt, size=size_bucket(archivo.size)).time():
+                if profile_mode in PROFILERS and getattr(request.user, 'is_admin', False):
+                    tree, profile = run_profiled(serializer.save, profile_mode)
+                else:
+                    tree, profile = serializer.save(), None
+        except Exception:
+            TREE_BUILDS.labels(format=fmt, status='error').inc()
+            raise
+        TREE_BUILDS.labels(format=fmt, status='ok').inc()
+        data = TreeSerializer(tree, context={'request': request}).data
+        if profile is not None:
+            data['profile'] = profile
+        return Response(data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -78,30 +114,222 @@ def tree_history(request):
 
     page = paginator.paginate_queryset(trees, request)
     serializer = TreeListSerializer(page, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    response = paginator.get_paginated_response(serializer.data)
+
+    # El listado cambia con cada árbol nuevo / borrado: ETag del contenido
+    # para responder 304 sin reenviar la página
+    etag = http_cache.content_etag(
+        json.dumps(response.data, sort_keys=True, default=str).encode('utf-8')
+    )
+    if (cached := http_cache.not_modified(request, etag)) is not None:
+        return cached
+    return http_cache.set_cache_headers(response, etag)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([TreeJSONRenderer])
 def tree_detail(request, pk):
     """
     Obtener detalles de un árbol específico.
 
     OPTIMIZACIÓN: select_related('bibliography') evita la segunda query
     al acceder a tree.bibliography dentro del TreeSerializer.
+    arbol_json se lee como texto (arbol_json::text) y TreeJSONRenderer lo
+    inserta tal cual: sin decodificar el JSONB ni volver a codificarlo.
+
+    Vista parcial (carga incremental en el frontend), con cualquiera de:
+      ?fields=label,_sap,group  atributos de nodo devueltos (id e index siempre)
+      ?nodes_only / ?links_only solo nodos / solo enlaces
+      ?include=statistics,metadata  secciones extra (defecto: ambas)
+      ?limit=N&cursor=...       paginación por cursor de los nodos (ya
+                                ordenados por SAP desc); "pagination" trae
+                                las URLs next / previous.
+    Solo se leen de la BD las secciones de arbol_json pedidas.
+
+    Caché: ETag / Last-Modified (304 sin leer arbol_json) y datos serializados
+    en la caché "trees" por usuario y variante (ver http_cache).
     """
+    meta = (
+        Tree.objects
+        .filter(pk=pk, user=request.user)
+        .values_list('content_hash', 'fecha_actualizado')
+        .first()
+    )
+    if meta is None:
+        raise Http404("Árbol no encontrado")
+    content_hash, modified = meta
+
+    partial = any(p in request.query_params for p in _DETAIL_PARAMS)
+    # La paginación devuelve URLs absolutas: el host forma parte de la variante
+    variant = '&'.join(
+        f'{p}={request.query_params[p]}' for p in _DETAIL_PARAMS if p in request.query_params
+    )
+    variant = f'{request.get_host()}?{variant}' if partial else ''
+    etag = http_cache.tree_etag(pk, content_hash, variant)
+    if (cached := http_cache.not_modified(request, etag, modified)) is not None:
+        return cached
+
+    key = http_cache.detail_cache_key(request.user.pk, pk, content_hash, variant)
+    if (data := http_cache.get_detail(key)) is not None:
+        return http_cache.set_cache_headers(Response(data), etag, modified)
+
+    response = _tree_detail_partial(request, pk) if partial else _tree_detail_full(request, pk)
+    if response.status_code == status.HTTP_200_OK:
+        http_cache.set_detail(key, response.data)
+        http_cache.set_cache_headers(response, etag, modified)
+    return response
+
+
+def _tree_detail_full(request, pk):
     try:
         tree = (
             Tree.objects
             .select_related('bibliography')            # ← FIX N+1
+            .defer('arbol_json')
+            .annotate(arbol_json_text=Cast('arbol_json', TextField()))
             .get(pk=pk, user=request.user)
         )
-        serializer = TreeSerializer(tree, context={'request': request})
+        serializer = TreeDetailSerializer(tree, context={'request': request})
         return Response(serializer.data)
     except Tree.DoesNotExist as e:
         raise Http404("Árbol no encontrado") from e
 
 
+def _flag(request, name):
+    return name in request.query_params and \
+        request.query_params[name].lower() not in ('0', 'false', 'no')
+
+
+def _encode_cursor(position, version):
+    raw = f"{position}|{version}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor, version):
+    """→ posición del cursor; ValueError si es inválido o de otra versión del árbol."""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    position, _, cursor_version = raw.partition('|')
+    if cursor_version != str(version):
+        raise ValueError('cursor de una versión anterior del árbol')
+    return max(int(position), 0)
+
+
+def _tree_detail_partial(request, pk):
+    nodes_only = _flag(request, 'nodes_only')
+    links_only = _flag(request, 'links_only')
+    if nodes_only and links_only:
+        return Response(
+            {'error': 'nodes_only y links_only son excluyentes'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    include = request.query_params.get('include')
+    sections = _DETAIL_SECTIONS if include is None else tuple(
+        name for name in _DETAIL_SECTIONS if name in {s.strip() for s in include.split(',')}
+    )
+    if nodes_only or links_only:
+        sections = sections if include is not None else ()
+    fields = request.query_params.get('fields')
+    fields = {f.strip() for f in fields.split(',') if f.strip()} | {'id', 'index'} if fields else None
+    paginate = 'cursor' in request.query_params or 'limit' in request.query_params
+    try:
+        limit = min(max(int(request.query_params.get('limit', _NODES_PAGE_SIZE)), 1), _NODES_PAGE_MAX)
+    except ValueError:
+        return Response({'error': 'limit debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+    want = {
+        'nodes':      not links_only,
+        'links':      not nodes_only,
+        'statistics': 'statistics' in sections,
+        'metadata':   'metadata' in sections,
+    }
+    annotations = {f'_json_{key}': KeyTransform(key, 'arbol_json') for key, on in want.items() if on}
+    # El cursor se valida contra generated_at: reclassify invalida cursores anteriores
+    annotations['_json_generated_at'] = KeyTransform('generated_at', KeyTransform('metadata', 'arbol_json'))
+    try:
+        tree = (
+            Tree.objects
+            .select_related('bibliography')
+            .defer('arbol_json')
+            .annotate(**annotations)
+            .get(pk=pk, user=request.user)
+        )
+    except Tree.DoesNotExist as e:
+        raise Http404("Árbol no encontrado") from e
+
+    arbol_json = {key: getattr(tree, f'_json_{key}') for key, on in want.items() if on}
+    pagination = None
+    if want['nodes']:
+        nodes = arbol_json['nodes'] or []
+        if paginate:
+            version = tree._json_generated_at
+            try:
+                start = _decode_cursor(request.query_params['cursor'], version) \
+                    if request.query_params.get('cursor') else 0
+            except (ValueError, UnicodeDecodeError):
+                return Response({'error': 'cursor inválido o caducado'}, status=status.HTTP_400_BAD_REQUEST)
+            end = start + limit
+            url = request.build_absolute_uri()
+            pagination = {
+                'count': len(nodes),
+                'next': replace_query_param(url, 'cursor', _encode_cursor(end, version))
+                        if end < len(nodes) else None,
+                'previous': (replace_query_param(url, 'cursor', _encode_cursor(max(start - limit, 0), version))
+                             if start > limit else remove_query_param(url, 'cursor'))
+                            if start > 0 else None,
+            }
+            nodes = nodes[start:end]
+        if fields is not None:
+            nodes = [{k: v for k, v in node.items() if k in fields} for node in nodes]
+        arbol_json['nodes'] = nodes
+
+    data = TreeDetailSerializer(
+        tree, context={'request': request, 'arbol_json': arbol_json}
+    ).data
+    if pagination is not None:
+        data['pagination'] = pagination
+    return Response(data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([TreeJSONRenderer])
+def tree_reclassify(request, pk):
+    """
+    Re-ajustar top_root_limit, top_trunk_limit, top_leaf_limit, leaf_window y
+    max_nodes de un árbol existente.
+
+    Solo re-ejecuta clasificación, PageRank y recorte sobre el snapshot
+    post-LCC guardado al generar el árbol (sin parseo, JW ni ghost nodes).
+    El árbol se actualiza con el resultado.
+    """
+    try:
+        tree = (
+            Tree.objects
+            .select_related('bibliography')
+            .get(pk=pk, user=request.user)
+        )
+    except Tree.DoesNotExist as e:
+        raise Http404("Árbol no encontrado") from e
+
+    serializer = TreeReclassifySerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    snapshot = TreeSnapshot.objects.filter(tree=tree).values_list('data', flat=True).first()
+    if snapshot is None:
+        return Response(
+            {'error': 'Este árbol no tiene snapshot para reclasificar. Genérelo de nuevo.'},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    tree.arbol_json = serializer.reclassify(tree, snapshot)
+    tree.build_perf = {**(tree.build_perf or {}), 'reclassify': serializer.perf}
+    tree.save(update_fields=['arbol_json', 'build_perf'])
+    http_cache.invalidate_tree(request.user.pk, tree.pk)
+    return Response(TreeSerializer(tree, context={'request': request}).data)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def tree_download(request, pk, format_type):
@@ -109,7 +337,22 @@ def tree_download(request, pk, format_type):
     Descargar árbol en JSON o PDF.
 
     OPTIMIZACIÓN: select_related('bibliography') igual que en tree_detail.
+    JSON y PDF responden 304 a peticiones condicionales (ETag por formato)
+    sin cargar el árbol ni regenerar el archivo.
     """
+    fmt = format_type.lower()
+    if fmt in ('json', 'pdf'):
+        meta = (
+            Tree.objects
+            .filter(pk=pk, user=request.user)
+            .values_list('content_hash', 'fecha_actualizado')
+            .first()
+        )
+        if meta is None:
+            raise Http404("Árbol no encontrado")
+        etag = http_cache.tree_etag(pk, meta[0], f'download:{fmt}')
+        if (cached := http_cache.not_modified(request, etag, meta[1])) is not None:
+            return cached
     try:
         tree = (
             Tree.objects
@@ -117,28 +360,29 @@ def tree_download(request, pk, format_type):
             .get(pk=pk, user=request.user)
         )
 
-        if format_type.lower() == 'json':
-            response = HttpResponse(
-                json.dumps(tree.arbol_json, indent=2, ensure_ascii=False),
-                content_type='application/json',
-            )
+        if fmt == 'json':
+            with EXPORT_SECONDS.labels(format='json').time():
+                content = json.dumps(tree.arbol_json, indent=2, ensure_ascii=False)
+            response = HttpResponse(content, content_type='application/json')
             response['Content-Disposition'] = f'attachment; filename="arbol_{tree.id}.json"'
-            return response
+            return http_cache.set_cache_headers(response, etag, tree.fecha_actualizado)
 
-        elif format_type.lower() == 'pdf':
+        elif fmt == 'pdf':
             # Generar PDF síncrono y servir directamente
             from .export_utils import generate_pdf_sync
-            pdf_content = generate_pdf_sync(tree)
+            with EXPORT_SECONDS.labels(format='pdf').time():
+                pdf_content = generate_pdf_sync(tree)
             
             response = HttpResponse(pdf_content, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="arbol_{tree.id}.pdf"'
             response['Content-Length'] = len(pdf_content)
-            return response
+            return http_cache.set_cache_headers(response, etag, tree.fecha_actualizado)
         
-        elif format_type.lower() == 'csv':
+        elif fmt == 'csv':
             # Generar CSV de nodos
             from .export_utils import generate_csv_sync, save_temp_file
-            csv_content = generate_csv_sync(tree)
+            with EXPORT_SECONDS.labels(format='csv').time():
+                csv_content = generate_csv_sync(tree)
             download_url, filename = save_temp_file(csv_content, f'arbol_{tree.id}.csv', 'text/csv')
             
             return Response({
@@ -166,6 +410,7 @@ def tree_delete(request, pk):
     try:
         tree = Tree.objects.get(pk=pk, user=request.user)
         tree.delete()
+        http_cache.invalidate_tree(request.user.pk, pk)
         return Response({'message': 'Árbol eliminado exitosamente.'})
     except Tree.DoesNotExist as e:
         raise Http404("Árbol no encontrado") from e
\ No newline at end of file